@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""Compares the memory footprint and lookup latency of Config against the
+original implementation, which kept its values in the instance __dict__
+too: for configs that all have the same keys (whose __dict__s share them),
+and for configs whose keys are all different.
+
+Usage: python benchmarks/config_memory.py [number of configs] [keys per config]
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from configtamer.compat import Mapping
+from configtamer.config import Config
+
+
+class DictConfig(Mapping):
+    """Config as it used to be: values in the instance __dict__, and a
+    key.lower() on every lookup."""
+    def __getattr__(self, attr):
+        if attr.lower() in self.__dict__:
+            return self.__dict__[attr.lower()]
+        raise AttributeError(attr)
+
+    def __add_key_value__(self, key, value):
+        self.__dict__[key.lower()] = value
+
+    def __getitem__(self, key):
+        return self.__dict__[key.lower()]
+    def __iter__(self):
+        return self.__dict__.__iter__()
+    def __len__(self):
+        return self.__dict__.__len__()
+
+
+def build_dict_configs(key_lists, values):
+    configs = []
+    for keys in key_lists:
+        config = DictConfig()
+        for key, value in zip(keys, values):
+            config.__add_key_value__(key, value)
+        configs.append(config)
+    return configs
+
+
+def build_configs(key_lists, values):
+    return [Config(zip(keys, values)) for keys in key_lists]
+
+
+def measure_memory(build, key_lists, values):
+    """Returns the bytes allocated by build(), per config."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    configs = build(key_lists, values)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(configs) == len(key_lists)
+    return (after - before) / len(key_lists)
+
+
+def measure_lookups(config, key, number=1000000):
+    """Returns nanoseconds per lookup, as an attribute and as an item."""
+    results = []
+    for statement in ("config.{}".format(key), "config[{!r}]".format(key)):
+        timer = timeit.Timer(statement, globals={'config': config})
+        results.append(min(timer.repeat(3, number)) / number * 1e9)
+    return results
+
+
+def main(n_configs=10000, n_keys=20):
+    # Keys and values are made beforehand, and shared between configs (as
+    # if they'd been interned), so only the containers themselves are
+    # measured.
+    keys = ["key_{}".format(i) for i in range(n_keys)]
+    values = ["value {}".format(i) for i in range(n_keys)]
+    shared = [keys] * n_configs
+    unique = [["key_{}_{}".format(n, i) for i in range(n_keys)] for n in range(n_configs)]
+
+    print("{} configs with {} keys each".format(n_configs, n_keys))
+    print("{:<12} {:>14} {:>14} {:>16} {:>16} {:>16}".format(
+        "", "bytes/config", "(unique keys)", "ns/attribute", "ns/item", "ns/Mixed.Case"))
+    for name, build in (("dict-based", build_dict_configs), ("Config", build_configs)):
+        memory = measure_memory(build, shared, values)
+        unique_memory = measure_memory(build, unique, values)
+        config = build([keys], values)[0]
+        attribute, item = measure_lookups(config, keys[n_keys // 2])
+        mixed_case, _ = measure_lookups(config, keys[n_keys // 2].title())
+        print("{:<12} {:>14.0f} {:>14.0f} {:>16.1f} {:>16.1f} {:>16.1f}".format(
+            name, memory, unique_memory, attribute, item, mixed_case))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""Generates synthetic config files, for benchmarking.
+
+Usage: python benchmarks/generate.py [parameter=value ...]
+
+Parameters are those of generate(), e.g. sections=100 fan_out=2. Prints
+the config.
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import random
+import sys
+
+
+def generate(keys=20, sections=10, section_keys=20, value_length=20, fan_out=0,
+             chain_depth=0, empty_lines=0.0, seed=0):
+    """Returns the text of a config with keys top-level keys, and sections
+    sections with section_keys keys each.
+
+    Values are about value_length characters long, plus whatever their
+    references add. At the top level and in each section, the first
+    chain_depth keys form a chain of references (each one references the one
+    before), and every other section value references fan_out top-level
+    keys, picked at random. (Referencing keys that reference others in turn
+    would make values grow exponentially.) empty_lines is the average number
+    of empty lines after each line (noise for the parser to skip).
+    """
+    rng = random.Random(seed)
+    lines = []
+
+    def add(line):
+        lines.append(line)
+        while rng.random() < empty_lines / (1 + empty_lines):
+            lines.append(rng.choice(["", "  ", "\t"]))
+
+    def literal():
+        return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz/._-") for _ in range(value_length)).strip() or "x"
+
+    def values(names, visible, indent):
+        for i, name in enumerate(names):
+            if 0 < i < chain_depth:
+                value = "{{{}}}/{}".format(names[i - 1], i)
+            else:
+                references = rng.sample(visible, min(fan_out, len(visible)))
+                value = " ".join([literal()] + ["{{{}}}".format(reference) for reference in references])
+            add("{}{}: {}".format(indent, name, value))
+
+    top_level = ["key_{}".format(i) for i in range(keys)]
+    values(top_level, [], "")
+    for section in range(sections):
+        add("section_{}:".format(section))
+        values(["key_{}_{}".format(section, i) for i in range(section_keys)], top_level, "    ")
+    return "\n".join(lines) + "\n"
+
+
+def main(*args):
+    parameters = {}
+    for arg in args:
+        name, value = arg.split("=", 1)
+        parameters[name] = float(value) if "." in value else int(value)
+    sys.stdout.write(generate(**parameters))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""Stress test for ConfigHandle: reader threads serve "requests" (each
+pinning a version and reading a few keys) while a writer thread keeps
+publishing new versions. Measures read throughput with and without the
+reloads, and checks that no request ever saw two versions.
+
+Usage: python benchmarks/handle_stress.py [--readers N] [--seconds S]
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import argparse
+import os
+import sys
+import threading
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import configtamer
+from generate import generate
+
+
+READS_PER_REQUEST = 10
+
+
+def versioned(config_string, version):
+    """config_string, with each section recording version."""
+    return configtamer.parse(config_string.replace(":\n", ":\n    version: {}\n".format(version)))
+
+
+def run(readers, seconds, reload):
+    """Returns (reads per second, versions published, inconsistent requests)."""
+    config_string = generate(keys=10, sections=20, section_keys=20)
+    versions = [versioned(config_string, version) for version in range(10)]
+    handle = configtamer.ConfigHandle(versions[0])
+    stop = threading.Event()
+    reads = [0] * readers
+    inconsistent = [0] * readers
+
+    def read(index):
+        count = errors = 0
+        while not stop.is_set():
+            with handle.pin():
+                seen = set()
+                for i in range(READS_PER_REQUEST):
+                    seen.add(handle.config['section_{}'.format(i)].version)
+                if len(seen) != 1:
+                    errors += 1
+            count += READS_PER_REQUEST
+        reads[index] = count
+        inconsistent[index] = errors
+
+    def write():
+        published = 0
+        while not stop.is_set():
+            handle.publish(versions[published % len(versions)])
+            published += 1
+        return published
+
+    threads = [threading.Thread(target=read, args=(i,)) for i in range(readers)]
+    published = [0]
+    if reload:
+        threads.append(threading.Thread(target=lambda: published.__setitem__(0, write())))
+    start = timeit.default_timer()
+    for thread in threads:
+        thread.start()
+    stop.wait(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = timeit.default_timer() - start
+    return sum(reads) / elapsed, published[0], sum(inconsistent)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ConfigHandle stress test")
+    parser.add_argument('--readers', type=int, default=4, help="reader threads (default: 4)")
+    parser.add_argument('--seconds', type=float, default=2.0, help="duration of each run (default: 2)")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for reload in (False, True):
+        throughput, published, inconsistent = run(args.readers, args.seconds, reload)
+        print("{:<16} {:>12,.0f} reads/s  {:>9,} versions published  {} inconsistent requests".format(
+            "with reloads" if reload else "without reloads", throughput, published, inconsistent))
+        failed = failed or inconsistent
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""Measures how long importing configtamer takes, with python -X importtime
+(Python 3.7+), and how long the first parse with each engine takes after
+that (which includes whatever imports were deferred to it).
+
+Usage: python benchmarks/importtime.py [--repeat N] [--top N]
+
+Each measurement is the best of --repeat fresh interpreters.
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+FIRST_PARSE = """
+import timeit
+import configtamer
+start = timeit.default_timer()
+configtamer.parse("root: /srv\\nsection:\\n    path: {{root}}/app\\n", engine={!r})
+print(timeit.default_timer() - start)
+"""
+
+
+def run(code, *options):
+    """Runs code in a fresh interpreter, from the root of the repository.
+    Returns its (stdout, stderr)."""
+    process = subprocess.Popen([sys.executable] + list(options) + ['-c', code], cwd=ROOT,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               universal_newlines=True)
+    stdout, stderr = process.communicate()
+    if process.returncode:
+        raise RuntimeError(stderr)
+    return stdout, stderr
+
+
+def import_times():
+    """Imports configtamer. Returns {module: (self microseconds, cumulative
+    microseconds)} for each module that was imported."""
+    _, stderr = run("import configtamer", '-X', 'importtime')
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        if own.strip().isdigit():
+            times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="configtamer import time benchmark")
+    parser.add_argument('--repeat', type=int, default=10,
+                        help="how many interpreters to start for each measurement (default: 10)")
+    parser.add_argument('--top', type=int, default=10,
+                        help="how many of the slowest modules to list (default: 10)")
+    args = parser.parse_args(argv)
+
+    runs = [import_times() for _ in range(args.repeat)]
+    best = min(runs, key=lambda times: times['configtamer'][1])
+    print("import configtamer: {:.1f} ms, {} modules".format(best['configtamer'][1] / 1000, len(best)))
+    print("slowest modules (own time, ms):")
+    slowest = sorted(best.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+    for name, (own, _) in slowest:
+        print("    {:<40} {:>8.1f}".format(name, own / 1000))
+
+    for engine in ('fast', 'peg'):
+        seconds = min(float(run(FIRST_PARSE.format(engine))[0]) for _ in range(args.repeat))
+        print("first parse, {} engine: {:.1f} ms".format(engine, seconds * 1000))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
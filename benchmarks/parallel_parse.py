@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""Benchmarks the "parallel" engine against the "fast" one on a big
+synthetic config, for an increasing number of worker processes: the time
+spent parsing, and the time for the whole of parse() (interpolation isn't
+done in parallel), each with its speedup over the "fast" engine.
+
+Usage: python benchmarks/parallel_parse.py [--sections N] [--max-workers N] [--repeat N]
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import argparse
+import multiprocessing
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from configtamer.batch import parse_parallel
+from configtamer.fastparser import parse_lines
+from configtamer.parser import process_config
+from generate import generate
+
+
+def best(function, repeat):
+    """Returns the shortest of repeat runs of function(), in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        function()
+        times.append(timeit.default_timer() - start)
+    return min(times)
+
+
+def worker_counts(max_workers):
+    """1, 2, 4... up to max_workers, which is always included."""
+    counts = []
+    workers = 1
+    while workers < max_workers:
+        counts.append(workers)
+        workers *= 2
+    return counts + [max_workers]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parallel parsing benchmark")
+    parser.add_argument('--sections', type=int, default=1000, help="sections of 100 keys (default: 1000)")
+    parser.add_argument('--max-workers', type=int, default=multiprocessing.cpu_count(),
+                        help="default: the number of CPUs")
+    parser.add_argument('--repeat', type=int, default=3, help="runs of each, the best is kept (default: 3)")
+    args = parser.parse_args(argv)
+
+    config_string = generate(keys=100, sections=args.sections, section_keys=100)
+    print("{:,} lines, {} CPUs".format(config_string.count("\n"), multiprocessing.cpu_count()))
+    fast_parse = best(lambda: parse_lines(config_string), args.repeat)
+    fast_total = best(lambda: process_config(parse_lines(config_string)), args.repeat)
+    print("{:<12} {:>8.3f} s parsing          {:>8.3f} s in all".format("fast", fast_parse, fast_total))
+    for workers in worker_counts(args.max_workers):
+        parse_seconds = best(lambda: parse_parallel(config_string, workers), args.repeat)
+        total_seconds = best(lambda: process_config(parse_parallel(config_string, workers)), args.repeat)
+        print("{:<12} {:>8.3f} s parsing ({:.2f}x) {:>8.3f} s in all ({:.2f}x)".format(
+            "{} worker{}".format(workers, "s" if workers > 1 else ""),
+            parse_seconds, fast_parse / parse_seconds, total_seconds, fast_total / total_seconds))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+"""Benchmarks parse() and Config lookups on synthetic configs, and checks
+for performance regressions against a baseline.
+
+Usage:
+    python benchmarks/suite.py --output baseline.json
+    ... change things ...
+    python benchmarks/suite.py --output results.json --baseline baseline.json
+
+With --baseline, exits with status 1 if any metric got worse than the
+baseline by more than --threshold (0.25, i.e. 25%, by default). Baselines
+are only meaningful on the machine (and Python) they were measured on.
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import configtamer
+from generate import generate
+
+
+# name: (engine, generate() parameters)
+SCENARIOS = {
+    'flat': ('fast', dict(keys=5000, sections=0)),
+    'sections': ('fast', dict(keys=10, sections=250, section_keys=20)),
+    'long_values': ('fast', dict(keys=10, sections=50, section_keys=20, value_length=500)),
+    'fan_out': ('fast', dict(keys=50, sections=100, section_keys=20, fan_out=4)),
+    'chains': ('fast', dict(keys=10, sections=50, section_keys=50, chain_depth=50)),
+    'noisy': ('fast', dict(keys=10, sections=100, section_keys=20, empty_lines=2.0)),
+    'peg': ('peg', dict(keys=10, sections=10, section_keys=20, fan_out=1)),
+}
+
+
+def measure_parse(config_string, engine, repeat):
+    """Returns the metrics for parsing config_string, each the best of
+    repeat runs (except for peak memory, measured once): total_seconds for
+    a plain parse(), and the time each phase took in instrumented ones."""
+    metrics = {}
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        configtamer.parse(config_string, engine=engine)
+        runs = [('total_seconds', timeit.default_timer() - start)]
+        stats = configtamer.ParseStats()
+        configtamer.parse(config_string, engine=engine, stats=stats)
+        runs.extend(('{}_seconds'.format(phase.name), phase.seconds) for phase in stats.phases)
+        for name, seconds in runs:
+            metrics[name] = min(metrics.get(name, seconds), seconds)
+
+    stats = configtamer.ParseStats(memory=True)
+    config = configtamer.parse(config_string, engine=engine, stats=stats)
+    if stats.peak_memory is not None:
+        metrics['peak_memory_bytes'] = stats.peak_memory
+    return config, metrics
+
+
+def measure_lookups(config, number=200000):
+    """Returns the metrics for reading a key of config (from its last
+    section, if it has any), as an attribute and as an item."""
+    sections = [key for key in config if isinstance(config[key], configtamer.config.Config)]
+    section = config[sections[-1]] if sections else config
+    key = list(section)[len(section) // 2]
+    metrics = {}
+    for name, statement in (('lookup_attribute_ns', "section.{}".format(key)),
+                            ('lookup_item_ns', "section[key]")):
+        timer = timeit.Timer(statement, globals={'section': section, 'key': key})
+        metrics[name] = min(timer.repeat(3, number)) / number * 1e9
+    return metrics
+
+
+def run(scenarios, repeat):
+    results = {}
+    for name in sorted(scenarios):
+        engine, parameters = scenarios[name]
+        config_string = generate(**parameters)
+        config, metrics = measure_parse(config_string, engine, repeat)
+        metrics.update(measure_lookups(config))
+        results[name] = {
+            'engine': engine,
+            'parameters': parameters,
+            'lines': config_string.count("\n"),
+            'metrics': metrics,
+        }
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Returns a list of (scenario, metric, baseline value, value) for each
+    metric that is worse than in baseline by more than threshold (a
+    fraction). Every metric is one where lower is better."""
+    regressions = []
+    for name, scenario in sorted(results.items()):
+        if name not in baseline:
+            continue
+        baseline_metrics = baseline[name]['metrics']
+        for metric, value in sorted(scenario['metrics'].items()):
+            reference = baseline_metrics.get(metric)
+            if reference and value > reference * (1 + threshold):
+                regressions.append((name, metric, reference, value))
+    return regressions
+
+
+def report(results, baseline=None):
+    for name, scenario in sorted(results.items()):
+        print("{} ({} lines, {} engine)".format(name, scenario['lines'], scenario['engine']))
+        baseline_metrics = baseline[name]['metrics'] if baseline and name in baseline else {}
+        for metric, value in sorted(scenario['metrics'].items()):
+            line = "    {:<24} {:>14.6g}".format(metric, value)
+            reference = baseline_metrics.get(metric)
+            if reference:
+                line += " {:>+8.1%}".format(value / reference - 1)
+            print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="configtamer benchmark suite")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--baseline', help="compare against the results in this JSON file")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="the slowdown that counts as a regression (default: 0.25)")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="how many times to parse each config (default: 5)")
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help="only run this scenario (can be given more than once)")
+    args = parser.parse_args(argv)
+
+    scenarios = dict((name, SCENARIOS[name]) for name in args.scenario or SCENARIOS)
+    results = run(scenarios, args.repeat)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['scenarios']
+    report(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'python': platform.python_version(),
+                       'machine': platform.machine(),
+                       'scenarios': results}, output, indent=2, sort_keys=True)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for name, metric, reference, value in regressions:
+            print("REGRESSION: {} {}: {:.6g} -> {:.6g} ({:+.1%})".format(
+                name, metric, reference, value, value / reference - 1))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
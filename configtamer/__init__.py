@@ -1,3 +1,25 @@
 #!/usr/bin/env python
 
+import sys
+
 from .parser import parse
+from .buffers import parse_buffer
+from .incremental import reparse
+from .fastparser import iterparse, SECTION_START, SECTION_END, ASSIGNMENT, INCLUDE
+from .loader import load
+from .writer import dump, dumps, Writer
+from .values import Value
+from .checker import check, Problem
+from .batch import parse_many, ParseResult
+from .watcher import watch, Watcher, ADDED, REMOVED, CHANGED
+from .handle import ConfigHandle, Snapshot
+from .layers import layered, Layered, environ_source, overrides_source
+from .cache import ParseCache
+from .stats import ParseStats
+from .spec import compile_spec, Spec, SpecError, ValidationError
+from .include import IncludeError
+from .interpolation import InterpolationError, MissingKeyError, CircularReferenceError
+
+if sys.version_info >= (3, 5):
+    # async/await syntax
+    from .aio import aload, aload_many
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""Loading configs from asyncio code (Python 3.5+ only).
+
+Reading and parsing run in an executor, so they don't block the event loop.
+asyncio itself is only imported when these are first called, to keep it
+out of the import time of programs that don't use it.
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import functools
+import os
+import weakref
+
+from .loader import load
+
+
+DEFAULT_LIMIT = 8
+
+# {event loop: {key: [future, number of callers waiting for it]}}: the
+# loads in flight, so that concurrent requests for the same one share it
+_in_flight = weakref.WeakKeyDictionary()
+
+
+async def aload(path, executor=None, **load_options):
+    """Like load(), but runs in executor (the event loop's default
+    executor, unless given), and is awaited.
+
+    Loads of the same path, with the same options, that are requested while
+    one is already in flight simply wait for it, and get the same Config.
+    Cancelling one of them doesn't affect the others; the load itself is
+    cancelled (if it hasn't started running yet) when all of them are.
+    """
+    import asyncio
+    loop = asyncio.get_event_loop()
+    key = _key(path, executor, load_options)
+    loads = _in_flight.setdefault(loop, {})
+    entry = loads.get(key) if key is not None else None
+    if entry is None:
+        future = loop.run_in_executor(executor, functools.partial(load, path, **load_options))
+        entry = [future, 0]
+        if key is not None:
+            loads[key] = entry
+            future.add_done_callback(functools.partial(_forget, loads, key, entry))
+
+    future = entry[0]
+    entry[1] += 1
+    try:
+        return await asyncio.shield(future)
+    finally:
+        entry[1] -= 1
+        if not entry[1] and not future.done():
+            # Nobody's waiting anymore
+            future.cancel()
+
+
+async def aload_many(paths, limit=DEFAULT_LIMIT, executor=None, return_exceptions=False,
+                     **load_options):
+    """aload()s each of paths, at most limit at a time. Returns a list of
+    Configs, in the same order as paths.
+
+    If return_exceptions is true, errors are returned in place of the
+    Config that couldn't be loaded. Otherwise, the first error is raised,
+    and the remaining loads are cancelled.
+    """
+    import asyncio
+    semaphore = asyncio.Semaphore(limit)
+
+    async def load_one(path):
+        async with semaphore:
+            return await aload(path, executor, **load_options)
+
+    tasks = [asyncio.ensure_future(load_one(path)) for path in paths]
+    try:
+        return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _key(path, executor, load_options):
+    """Returns what identifies a load, or None if it can't be shared."""
+    key = (os.path.abspath(path), executor, tuple(sorted(load_options.items())))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def _forget(loads, key, entry, future):
+    if loads.get(key) is entry:
+        del loads[key]
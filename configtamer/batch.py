@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""Parsing many configs at once, in parallel, and big ones in parallel
+chunks (the "parallel" engine)."""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import functools
+from collections import namedtuple
+
+from .fastparser import _Stop, collect, events, parse_lines, split_lines, syntax_error
+from .incremental import split_chunks, _shift
+from .loader import load
+from .parser import parse
+
+
+# Exactly one of config and error is None
+ParseResult = namedtuple('ParseResult', ['config', 'error'])
+
+
+def parse_many(sources, workers=None, chunksize=None, paths=False, **parse_options):
+    """Parses each of sources, across a pool of workers processes (as many
+    as there are CPUs, by default). Returns a list of ParseResults, in the
+    same order as sources.
+
+    Each source is either the text of a config, or the path to a config
+    file: path-like objects (such as pathlib.Path) are paths, and strings are
+    texts, unless paths is true. Errors (syntax, interpolation, I/O...) don't
+    stop the others from being parsed: they're returned as the error of their
+    ParseResult.
+
+    Sources are sent to workers chunksize at a time (by default, enough to
+    make about four chunks per worker). If workers is 1 or less, everything
+    is parsed in this process.
+
+    Any other arguments are passed on to parse(). Configs are fully
+    interpolated, even if lazy=True, to be sent back from the workers, and so
+    interpolation errors are returned too.
+    """
+    # Imported here, as importing multiprocessing isn't cheap
+    import multiprocessing
+    sources = list(sources)
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = min(workers, len(sources))
+    parse_options['lazy'] = False
+    parse_one = functools.partial(_parse_one, paths=paths, parse_options=parse_options)
+    if workers <= 1:
+        return [parse_one(source) for source in sources]
+
+    if chunksize is None:
+        chunksize = -(-len(sources) // (workers * 4))
+    pool = multiprocessing.Pool(workers)
+    try:
+        return pool.map(parse_one, sources, chunksize)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _parse_one(source, paths, parse_options):
+    try:
+        if paths or hasattr(source, '__fspath__'):
+            config = load(source, **parse_options)
+        else:
+            config = parse(source, **parse_options)
+    except Exception as exc:
+        return ParseResult(None, exc)
+    return ParseResult(config, None)
+
+
+def parse_parallel(config_string, workers=None):
+    """Parses config_string into a list of assignment and section dicts,
+    like the "fast" engine, in pieces, across a pool of workers processes
+    (as many as there are CPUs, by default). Raises the same SyntaxError.
+
+    The text is split at its top-level section headers, where parsing starts
+    afresh: each piece holds a run of whole sections, about as long as the
+    others, and there are about four pieces per worker. Interpolation is
+    left to process_config(), in this process. Starting the workers takes a
+    while, so this only pays off for big configs.
+    """
+    import multiprocessing
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if workers <= 1:
+        return parse_lines(config_string)
+    # (text, offset, line number) for each piece
+    pieces = []
+    size = -(-len(config_string) // (workers * 4))
+    start = end = 0
+    line = 1
+    for chunk in split_chunks(config_string):
+        if end - start >= size:
+            pieces.append((config_string[start:end], start, line))
+            start, line = end, chunk.line
+        end += len(chunk.text)
+    pieces.append((config_string[start:], start, line))
+    if len(pieces) == 1:
+        return parse_lines(config_string)
+    pool = multiprocessing.Pool(min(workers, len(pieces)))
+    try:
+        results = pool.map(_parse_piece, pieces)
+    finally:
+        pool.close()
+        pool.join()
+    parsed = []
+    for items, stop in results:
+        if stop is not None:
+            raise syntax_error(config_string, stop)
+        parsed.extend(items)
+    return parsed
+
+
+def _parse_piece(piece):
+    """Returns (items, None), or (None, the offset in the whole text where
+    parsing stopped)."""
+    text, offset, line = piece
+    try:
+        return _shift(collect(events(split_lines(text))), line - 1), None
+    except _Stop as stop:
+        return None, offset + stop.pos
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""Parsing configs straight from bytes, or from memory-mapped files.
+
+The text of the config is never held in memory as a whole: lines are decoded
+one at a time, as they're parsed, and values are kept as Spans of the
+buffer, only decoded when they're interpolated. With lazy=True, that's when
+they're first read: memory use then grows with the number of values read,
+rather than with the size of the file (mapped pages are the OS's to evict).
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import io
+import re
+
+from .config import LazyConfig
+from .fastparser import ASSIGNMENT, Event, _Stop, collect, events
+from .include import Includer
+from .interpolation import Scope, add_items, link_defaults
+from .parser import build_config
+
+
+_line_re = re.compile(br'([^\r\n]*)(\r\n|\n|\r)?')
+
+
+class Span(object):
+    """A value, as the (UTF-8 encoded) bytes between start and end in buffer."""
+    __slots__ = ('buffer', 'start', 'end')
+
+    def __init__(self, buffer, start, end):
+        self.buffer = buffer
+        self.start = start
+        self.end = end
+
+    def decode(self):
+        return self.buffer[self.start:self.end].decode('utf-8')
+
+    def __repr__(self):
+        return "Span({}, {})".format(self.start, self.end)
+
+
+class BufferScope(Scope):
+    """A Scope whose raw values may be Spans, decoded when they're looked at.
+    They're not kept decoded: once interpolated, the Scope keeps the result."""
+
+    def raw(self, key):
+        value, line = self.find(key).assignments[key]
+        if isinstance(value, Span):
+            value = value.decode()
+        return value, line
+
+
+def parse_buffer(buffer, lazy=False, flatten_defaults=False, directory=None):
+    """Parses the config in buffer: bytes, an mmap, or any other object that
+    supports slicing into bytes and regular expression matching. It's UTF-8
+    encoded. Returns a Config object, which keeps a reference to buffer for
+    as long as some of its values haven't been interpolated.
+
+    The other arguments are those of parse(): in particular, lazy=True keeps
+    values that are never read from ever being decoded. Gives the same
+    results, and raises the same errors, as parse(buffer.decode('utf-8')),
+    except that syntax errors only quote the line they're on.
+    """
+    try:
+        parsed_config = collect(_span_events(buffer))
+    except _Stop as stop:
+        raise stop.syntax_error()
+    scope = add_items(BufferScope(), parsed_config, Includer(directory))
+    link_defaults(scope)
+    if lazy:
+        return LazyConfig(scope)
+    return build_config(scope)
+
+
+def map_file(path):
+    """Returns a read-only mmap of the file at path (bytes, if it's empty:
+    empty files can't be mapped)."""
+    # Only needed for load(mmap=True)
+    import mmap
+    with io.open(path, 'rb') as config_file:
+        try:
+            return mmap.mmap(config_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return config_file.read()
+
+
+def _span_events(buffer):
+    """Yields the parse events for buffer, with Spans for values."""
+    # The offset, the bytes and the number of the line being parsed, and its
+    # length once decoded
+    current = [0, b'', 0, 0]
+
+    def lines():
+        pos = 0
+        lineno = 0
+        while True:
+            match = _line_re.match(buffer, pos)
+            line, newline = match.groups()
+            text = line.decode('utf-8')
+            lineno += 1
+            current[:] = pos, line, lineno, len(text)
+            yield pos, text, newline
+            if newline is None:
+                return
+            pos = match.end()
+
+    for event in events(lines()):
+        # Values ending with a comma only come once the next line has been
+        # read (see events()): those are left as they are, already decoded.
+        if event.event == ASSIGNMENT and event.line == current[2]:
+            # The value is at the end of its line, but for spaces and tabs
+            offset, line, _, text_length = current
+            end = offset + len(line.rstrip(b' \t'))
+            value = event.value
+            # Only non-ASCII lines need encoding again
+            length = len(value) if len(line) == text_length else len(value.encode('utf-8'))
+            event = Event(ASSIGNMENT, event.key, Span(buffer, end - length, end), event.line)
+        yield event
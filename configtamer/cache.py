@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+"""An on-disk cache of processed configs, for load().
+
+Entries are keyed by a hash of the file's contents, so an entry can never
+be stale: an edited file simply hashes to a different entry. To avoid even
+reading and hashing files that haven't changed, the cache also remembers
+the size, mtime and inode each path had when it was last hashed.
+
+Layout of the cache directory:
+    objects/<content hash>  the processed config, marshalled
+    paths/<path hash>       "<size> <mtime_ns> <inode> <content hash>"
+
+Every file is written to a temporary file and renamed into place, so
+concurrent processes never see partial entries.
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import os
+import time
+
+from .config import Config
+from .compat import replace, text_type
+from .values import Value
+
+
+# Bump whenever parsing or the serialized form changes, to orphan old entries
+FORMAT_VERSION = b'configtamer-cache-2\n'
+
+# Files modified less than this many seconds before they were stat'ed might
+# be modified again without their mtime changing, so they're always hashed.
+RACY_INTERVAL = 2
+
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+
+def default_directory():
+    """$CONFIGTAMER_CACHE_DIR, or configtamer/ in the user's cache directory."""
+    directory = os.environ.get('CONFIGTAMER_CACHE_DIR')
+    if directory:
+        return directory
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'configtamer')
+
+
+def content_hash(data):
+    """Returns the cache key for a file's contents (bytes)."""
+    # hashlib and marshal are only imported when the cache is used
+    import hashlib
+    return hashlib.sha256(FORMAT_VERSION + data).hexdigest()
+
+
+def serialize(config):
+    """Returns config as nested (keys, values) tuples of plain strings,
+    with each section as a nested tuple, marshalled."""
+    import marshal
+    return FORMAT_VERSION + marshal.dumps(_to_tuples(config), 2)
+
+
+def deserialize(data):
+    """The inverse of serialize(). Raises ValueError for invalid data."""
+    if not data.startswith(FORMAT_VERSION):
+        raise ValueError("Not a configtamer cache entry")
+    import marshal
+    try:
+        tree = marshal.loads(data[len(FORMAT_VERSION):])
+    except (EOFError, TypeError) as exc:
+        raise ValueError("Corrupt configtamer cache entry: {}".format(exc))
+    return _from_tuples(tree)
+
+
+def _to_tuples(config):
+    keys = tuple(config)
+    # marshal only takes plain strings, not Values
+    values = tuple(_to_tuples(value) if isinstance(value, Config) else text_type(value)
+                   for value in Config.values(config))
+    return keys, values
+
+
+def _from_tuples(tree):
+    keys, values = tree
+    return Config(zip(keys, [_from_tuples(value) if isinstance(value, tuple) else Value(value)
+                             for value in values]))
+
+
+class ParseCache(object):
+    """A cache directory for load(), holding at most max_size bytes of
+    entries (the least recently used ones are removed first)."""
+
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory if directory is not None else default_directory()
+        self.max_size = max_size
+
+    def _path_entry(self, path):
+        import hashlib
+        key = hashlib.sha256(os.path.abspath(path).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, 'paths', key)
+
+    def _object(self, digest):
+        return os.path.join(self.directory, 'objects', digest)
+
+    def lookup_path(self, path, stat):
+        """Returns the content hash remembered for path, if it still has
+        the size, mtime and inode in stat (an os.stat_result)."""
+        try:
+            with open(self._path_entry(path), 'rb') as entry:
+                fields = entry.read().decode('ascii').split()
+        except (IOError, OSError, UnicodeDecodeError):
+            return None
+        if len(fields) != 4 or fields[:3] != [str(field) for field in _fingerprint(stat)]:
+            return None
+        return fields[3]
+
+    def remember_path(self, path, stat, digest):
+        """Remembers that path, as described by stat, hashes to digest."""
+        if time.time() - stat.st_mtime < RACY_INTERVAL:
+            return
+        fields = [str(field) for field in _fingerprint(stat)] + [digest]
+        self._write(self._path_entry(path), " ".join(fields).encode('ascii'))
+
+    def get(self, digest):
+        """Returns the Config cached under digest, or None."""
+        filename = self._object(digest)
+        try:
+            with open(filename, 'rb') as entry:
+                config = deserialize(entry.read())
+        except (IOError, OSError):
+            return None
+        except ValueError:
+            self._remove(filename)
+            return None
+        try:
+            # Keep track of when each entry was last used, for eviction
+            os.utime(filename, None)
+        except OSError:
+            pass
+        return config
+
+    def put(self, digest, config):
+        """Caches config under digest, then trims the cache to max_size."""
+        if self._write(self._object(digest), serialize(config)):
+            self.trim()
+
+    def trim(self):
+        """Removes the least recently used entries until the cache holds at
+        most max_size bytes."""
+        directory = os.path.join(self.directory, 'objects')
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return
+        entries = []
+        for name in names:
+            if name.startswith('.tmp-'):
+                # Still being written
+                continue
+            filename = os.path.join(directory, name)
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, filename))
+        total = sum(size for _, size, _ in entries)
+        for _, size, filename in sorted(entries):
+            if total <= self.max_size:
+                break
+            self._remove(filename)
+            total -= size
+
+    def clear(self):
+        """Removes every entry."""
+        for subdirectory in ('objects', 'paths'):
+            directory = os.path.join(self.directory, subdirectory)
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in names:
+                self._remove(os.path.join(directory, name))
+
+    def _write(self, filename, data):
+        """Atomically writes data to filename. The cache is only an
+        optimization, so failing to write to it isn't an error: returns
+        whether it worked."""
+        # Only needed when writing: tempfile imports a lot
+        import tempfile
+        directory = os.path.dirname(filename)
+        try:
+            _makedirs(directory)
+            fd, temporary = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+            try:
+                with os.fdopen(fd, 'wb') as output:
+                    output.write(data)
+                replace(temporary, filename)
+            except BaseException:
+                self._remove(temporary)
+                raise
+        except (IOError, OSError):
+            return False
+        return True
+
+    @staticmethod
+    def _remove(filename):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+
+def _makedirs(directory):
+    try:
+        os.makedirs(directory)
+    except OSError:
+        # Python 2 has no exist_ok
+        if not os.path.isdir(directory):
+            raise
+
+
+def _fingerprint(stat):
+    """Returns what tells whether a file has changed: its size, mtime (in
+    nanoseconds) and inode, as in stat. None if stat is None."""
+    if stat is None:
+        return None
+    return stat.st_size, _mtime_ns(stat), stat.st_ino
+
+
+def _mtime_ns(stat):
+    if hasattr(stat, 'st_mtime_ns'):
+        return stat.st_mtime_ns
+    # Python 2
+    return int(stat.st_mtime * 1e9)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""Checking configs for every error at once, rather than stopping at the
+first one like parse() does.
+
+After a syntax error, parsing resumes at the next line, or at the next
+section if the error was in a section header. Sections that turn out empty,
+and the assignments of sections whose header is invalid, are left out of
+what's checked next: references, section defaults and include directives.
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from collections import namedtuple
+
+from .config import Config
+from .fastparser import collect, events, split_lines
+from .include import IncludeError, Includer
+from .interpolation import (InterpolationError, MissingKeyError, CircularReferenceError,
+                            Scope, add_items, link_defaults)
+
+
+# line is None for errors that aren't about a particular line, and column
+# is None for errors that are about a whole line (or value). error is the
+# exception parse() would raise: a SyntaxError, an InterpolationError or an
+# IncludeError.
+Problem = namedtuple('Problem', ['line', 'column', 'error'])
+
+
+def check(config_string, directory=None):
+    """Checks config_string for syntax errors, invalid references, missing
+    or circular section defaults, and fragments that can't be included (see
+    parse() for directory). Returns a list of Problems, in the order of their
+    lines: empty if parse(config_string) would succeed.
+
+    Errors that parse() would raise are reported in the same terms, though
+    after the first one, some errors may be consequences of earlier ones.
+    """
+    problems = []
+    stops = []
+    parsed_config = collect(events(split_lines(config_string), stops))
+    for stop in stops:
+        problems.append(Problem(stop.lineno, stop.pos - stop.start + 1, stop.syntax_error()))
+
+    include = _CheckingIncluder(directory, problems)
+    scope = add_items(Scope(), parsed_config, include)
+    _link_defaults(scope, problems)
+    _resolve(scope, problems)
+    problems.sort(key=lambda problem: (problem.line is None, problem.line or 0, problem.column or 0))
+    return problems
+
+
+class _CheckingIncluder(Includer):
+    """An Includer that reports fragments that can't be included, and
+    includes nothing in their place."""
+
+    def __init__(self, directory, problems):
+        Includer.__init__(self, directory)
+        self.problems = problems
+
+    def __call__(self, path, line=None):
+        try:
+            return Includer.__call__(self, path, line)
+        except (IncludeError, SyntaxError, InterpolationError) as exc:
+            self.problems.append(Problem(line, None, exc))
+            return Config()
+
+
+def _link_defaults(scope, problems):
+    """link_defaults(), dropping each section default that's missing or
+    part of a cycle, until the rest can be linked."""
+    while True:
+        try:
+            link_defaults(scope)
+            return
+        except MissingKeyError as exc:
+            problems.append(Problem(exc.line, None, exc))
+            path = exc.path
+        except CircularReferenceError as exc:
+            problems.append(Problem(exc.cycle[0][1], None, exc))
+            path = exc.cycle[0][0]
+        section = scope
+        for name in path.split("."):
+            section = section.sections[name]
+        section.default_name = section.default = None
+
+
+def _resolve(scope, problems):
+    """Resolves every value in a Scope tree, reporting each missing key and
+    each cycle once."""
+    seen = set()
+    pending = [scope]
+    while pending:
+        scope = pending.pop()
+        pending.extend(scope.sections.values())
+        for key in scope.keys():
+            try:
+                scope.resolve(key)
+            except MissingKeyError as exc:
+                if (exc.path, exc.reference) not in seen:
+                    seen.add((exc.path, exc.reference))
+                    problems.append(Problem(exc.line, None, exc))
+            except CircularReferenceError as exc:
+                if frozenset(exc.cycle) not in seen:
+                    seen.add(frozenset(exc.cycle))
+                    problems.append(Problem(exc.cycle[0][1], None, exc))
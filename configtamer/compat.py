@@ -5,6 +5,7 @@ from __future__ import print_function
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import os
 import sys
 
 
@@ -20,3 +21,43 @@ def raise_(exception_type, message=None, traceback=None):
         raise exception_type(message)
     else:
         raise exception_type(message).with_traceback(traceback)
+
+
+try:
+    text_type = unicode
+    string_types = (str, unicode)
+except NameError:
+    # Python 3
+    text_type = str
+    string_types = (str,)
+
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    # Python 2
+    from collections import Mapping
+
+
+try:
+    intern = sys.intern
+except AttributeError:
+    # Python 2, whose intern() only takes byte strings
+    _interned = {}
+
+    def intern(string):
+        return _interned.setdefault(string, string)
+
+
+# A lock, without importing threading (which programs that don't use
+# threads don't need to pay for)
+try:
+    from _thread import allocate_lock
+except ImportError:
+    # Python 2
+    from thread import allocate_lock
+
+
+# Atomic rename, even over an existing file. Python 2 only has it on POSIX,
+# as os.rename.
+replace = getattr(os, 'replace', os.rename)
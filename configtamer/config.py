@@ -5,30 +5,285 @@ from __future__ import print_function
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
-import collections
+import weakref
+from types import MethodType
 
+from .compat import Mapping, intern
+
+
+# {keys: Shape}
+_shapes = weakref.WeakValueDictionary()
+
+# {id(config): (weak reference to config, the index get_path() built)}. Not
+# kept in a slot, which every Config would pay for.
+_path_indexes = {}
+
+
+class Shape(object):
+    """The keys of a LazyConfig (lowercase, in order), and an index of them:
+    {key: position}."""
+    __slots__ = ('keys', 'index', '__weakref__')
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.index = dict((key, position) for position, key in enumerate(keys))
+
+
+def shape(keys):
+    """Returns the Shape of LazyConfigs with keys (a sequence of lowercase
+    keys). LazyConfigs with the same keys in the same order (e.g. the same
+    section in many similar files) share a single Shape.
+    """
+    keys = tuple(keys)
+    config_shape = _shapes.get(keys)
+    if config_shape is None:
+        config_shape = _shapes[keys] = Shape(keys)
+    return config_shape
+
+
+def _instance_slots(base, names):
+    """Returns the names of __dict__ and __weakref__ (from names) that
+    instances of base don't have already: declaring them again is an error
+    (on Python 2, Mapping has both)."""
+    offsets = {'__dict__': base.__dictoffset__, '__weakref__': base.__weakrefoffset__}
+    return tuple(name for name in names if not offsets[name])
+
+
+class _method(object):
+    """A method that keys can't hide: as a data descriptor, it's found
+    before the instance __dict__ (so config.items() works, even if config
+    has an "items" key, which can still be read as config['items'])."""
+    __slots__ = ('function',)
+
+    def __init__(self, function):
+        self.function = function
+
+    def __get__(self, config, cls=None):
+        if config is None:
+            return self.function
+        return MethodType(self.function, config)
+
+    def __set__(self, config, value):
+        raise AttributeError("Configs are read-only: can't set '{}'".format(self.function.__name__))
+
+
+class Config(Mapping):
+    """A config section (or the top level of a config): a mapping of
+    case-insensitive keys to values, which can also be read as attributes.
+
+    Values are kept in the instance __dict__, under their lowercase keys, so
+    reading a lowercase key as an attribute is an ordinary attribute lookup,
+    and reading it as an item a single dict lookup. Keys are only lowercased
+    if they aren't found as given. There's nothing else in a Config: on
+    Python 3, the __dict__s of Configs with the same keys share those keys.
+
+    Configs are read-only, so they can be shared between threads freely.
+    """
+    __slots__ = _instance_slots(Mapping, ('__dict__', '__weakref__'))
+
+    def __new__(cls, items=()):
+        """items is a mapping, or an iterable of (key, value) pairs."""
+        if isinstance(items, Mapping):
+            items = items.items()
+        self = object.__new__(cls)
+        values = self.__dict__
+        for key, value in items:
+            values[key.lower()] = value
+        return self
+
+    def __init__(self, items=()):
+        # Everything was done in __new__
+        pass
+
+    def __reduce__(self):
+        # With interned keys, pickle only writes the keys of Configs of the
+        # same shape once
+        return (_rebuild, (tuple(map(intern, self.__dict__)), tuple(self.__dict__.values())))
 
-class Config(collections.Mapping):
     def __getattr__(self, attr):
-        if attr.lower() in self.__dict__:
-            return self.__dict__[attr.lower()]
+        # Only called when attr isn't a lowercase key (nor anything else)
+        if attr[:1] != '_':
+            values = self.__dict__
+            key = attr.lower()
+            if key in values:
+                return values[key]
         raise AttributeError("'{}' object has no attribute '{}'".format(self.__class__.__name__, attr))
 
     def __repr__(self):
-        return self.__dict__.__str__()
-    # TODO: perhaps have __str__ return a config file-like representation
+        return dict(self.items()).__str__()
+    # See configtamer.dumps() for a config file-like representation
     __str__ = __repr__
-        
 
-    # FIXME: this should probably go :)
-    def __add_key_value__(self, key, value):
-        self.__dict__[key.lower()] = value
+    def get_path(self, path, default=None):
+        """Returns the value (or section) at a dotted path, such as
+        "production.servers.dbservers", or default if there's none.
 
+        The first call indexes every path in the config, so each lookup is
+        then a single dict lookup, however deep the path.
+        """
+        key = id(self)
+        reference, paths = _path_indexes.get(key, (None, None))
+        if reference is None or reference() is not self:
+
+            def forget(reference):
+                if _path_indexes.get(key, (None, None))[0] is reference:
+                    del _path_indexes[key]
+
+            paths = _index_paths(self)
+            _path_indexes[key] = (weakref.ref(self, forget), paths)
+        value = paths.get(path, _missing)
+        if value is _missing:
+            value = paths.get(path.lower(), default)
+        return value
+
+    def __setattr__(self, attr, value):
+        raise AttributeError("Configs are read-only: can't set '{}'".format(attr))
+
+    def __delattr__(self, attr):
+        raise AttributeError("Configs are read-only: can't delete '{}'".format(attr))
 
     # Mapping ABC
     def __getitem__(self, key):
-        return self.__dict__[key.lower()]
+        values = self.__dict__
+        if key in values:
+            return values[key]
+        return values[key.lower()]
     def __iter__(self):
-        return self.__dict__.__iter__()
+        return iter(self.__dict__)
     def __len__(self):
-        return self.__dict__.__len__()
+        return len(self.__dict__)
+
+    # Mapping's would catch the KeyErrors (MissingKeyError) raised by
+    # LazyConfigs for values that can't be interpolated
+    def __contains__(self, key):
+        values = self.__dict__
+        return key in values or key.lower() in values
+    def get(self, key, default=None):
+        values = self.__dict__
+        if key in values:
+            return values[key]
+        return values.get(key.lower(), default)
+
+
+# Keys can't hide these
+for _name in ('keys', 'items', 'values', 'get', 'get_path'):
+    setattr(Config, _name, _method(getattr(Config, _name)))
+del _name
+
+
+def _rebuild(keys, values):
+    """Unpickles a Config. keys are already lowercase and unique."""
+    return Config(zip(keys, values))
+
+
+_missing = object()
+
+
+def _index_paths(config):
+    """Returns {dotted path: value} for every key and section in config,
+    subsections included. Paths are lowercase."""
+    paths = {}
+    pending = [("", config)]
+    while pending:
+        prefix, section = pending.pop()
+        for key in section:
+            value = section[key]
+            paths[prefix + key] = value
+            if isinstance(value, Config):
+                pending.append((prefix + key + ".", value))
+    return paths
+
+
+class LazyConfig(Config):
+    """A Config that interpolates each value, and builds each section,
+    the first time it's read. Values that are never read are never
+    interpolated, and neither are sections that are never read: until then,
+    they're simply not in the instance __dict__ (and reading them goes
+    through __getattr__). Its Shape holds its keys.
+
+    Interpolation errors are raised when the offending value is read, by
+    get() and hasattr() too: they're not mistaken for missing keys. Whether
+    a key is in a LazyConfig doesn't depend on its value.
+    """
+    __slots__ = ('_shape', '_scope')
+
+    def __new__(cls, scope):
+        # scope is an interpolation.Scope
+        keys = [key for key in scope.keys() if key not in scope.sections]
+        keys.extend(scope.sections)
+        self = object.__new__(cls)
+        object.__setattr__(self, '_shape', shape(keys))
+        object.__setattr__(self, '_scope', scope)
+        return self
+
+    def __init__(self, scope):
+        pass
+
+    def __reduce__(self):
+        # Pickles (and copies) as a plain Config, loading everything
+        return (_rebuild, (tuple(map(intern, self._shape.keys)), tuple(self[key] for key in self._shape.keys)))
+
+    def __load__(self, key):
+        """Resolves key (already lowercase), and keeps the result."""
+        scope = self._scope
+        if key in scope.sections:
+            value = LazyConfig(scope.sections[key])
+        else:
+            value = scope.resolve(key)
+        self.__dict__[key] = value
+        return value
+
+    def get_path(self, path, default=None):
+        # Not indexed, which would load everything: each step is a lookup
+        config = self
+        for name in path.split("."):
+            if not isinstance(config, Config) or name not in config:
+                return default
+            config = config[name]
+        return config
+
+    def __getattr__(self, attr):
+        # Called for keys that haven't been loaded yet, too
+        if attr[:1] != '_':
+            index = self._shape.index
+            key = attr if attr in index else attr.lower()
+            if key in index:
+                value = self.__dict__.get(key, _missing)
+                if value is _missing:
+                    value = self.__load__(key)
+                return value
+        raise AttributeError("'{}' object has no attribute '{}'".format(self.__class__.__name__, attr))
+
+    def __repr__(self):
+        return dict((key, self[key]) for key in self._shape.keys).__str__()
+    __str__ = __repr__
+
+    # Mapping ABC
+    def __getitem__(self, key):
+        values = self.__dict__
+        if key in values:
+            return values[key]
+        if key not in self._shape.index:
+            key = key.lower()
+            if key in values:
+                return values[key]
+            if key not in self._shape.index:
+                raise KeyError(key)
+        return self.__load__(key)
+    def __iter__(self):
+        return iter(self._shape.keys)
+    def __len__(self):
+        return len(self._shape.keys)
+
+    def __contains__(self, key):
+        index = self._shape.index
+        return key in index or key.lower() in index
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+
+for _name in ('get', 'get_path'):
+    setattr(LazyConfig, _name, _method(LazyConfig.__dict__[_name]))
+del _name
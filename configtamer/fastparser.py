@@ -0,0 +1,428 @@
+#!/usr/bin/env python
+"""A hand-written, line-oriented parser engine.
+
+It accepts exactly the same language as the PEG grammar in peg.py and
+produces the same list of assignment and section dicts as
+ConfigTamerNodeVisitor, but it makes a single pass over the input, one line
+at a time. There is no recursion, so stack depth doesn't grow with the size
+of the file, and parse time is linear.
+
+At its core is a stream of parse events, which iterparse() exposes for
+reading file objects without holding them in memory.
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import re
+from collections import deque, namedtuple
+
+
+_line_re = re.compile(r'([^\r\n]*)(\r\n|\n|\r)?')
+# These mirror the "assignment", "indented_assignment", "section_header" and
+# "include" rules of the grammar. The assignment and include regexes aren't
+# anchored at the end of the line: like the grammar, they may match only a
+# prefix of it.
+_assignment_re = re.compile(
+    r'([a-z0-9][a-z0-9_]*)[ \t]*[:=][ \t]*([^\s](?:[^\r\n]*[^\s])?)[ \t]*', re.I)
+_indented_assignment_re = re.compile(r' +' + _assignment_re.pattern, re.I)
+_section_header_re = re.compile(
+    r'([a-z0-9][a-z0-9_]*)[ \t]*'
+    r'(?:\[[ \t]*default[ \t]*:[ \t]*([a-z0-9][a-z0-9_]*)[ \t]*\][ \t]*)?'
+    r':[ \t]*\Z', re.I)
+_include_re = re.compile(r'@include[ \t]+([^\s](?:[^\r\n]*[^\s])?)[ \t]*')
+# A continuation line, after the indentation of the assignment it continues
+_continuation_re = re.compile(r'[ \t]+([^\s](?:[^\r\n]*[^\s])?)[ \t]*')
+_whitespace_re = re.compile(r'[ \t]*')
+
+
+# Parse events. key is the section name for SECTION_START and SECTION_END.
+# value is the raw value for ASSIGNMENT, the path for INCLUDE, and for
+# SECTION_START, the name of the section it defaults to (if any). line is
+# where the section header, the assignment or the include directive is, or
+# for SECTION_END, the section's last assignment.
+#
+# Sections nest: a section header within a section starts a subsection if
+# the next line that isn't empty is indented more deeply than the header.
+# The subsection then holds every line after it that's indented more deeply
+# than its header. (Other indented headers start top-level sections.)
+#
+# A value that ends with a comma is continued on the lines that follow it,
+# as long as they're indented more deeply than its key: its ASSIGNMENT event
+# comes once they've been read, with the lines joined by single spaces.
+SECTION_START = 'section_start'
+SECTION_END = 'section_end'
+ASSIGNMENT = 'assignment'
+INCLUDE = 'include'
+
+Event = namedtuple('Event', ['event', 'key', 'value', 'line'])
+
+
+def split_lines(text):
+    """Yields (offset, line, newline) for each line in text.
+    newline is the line terminator, or None for the last line."""
+    pos = 0
+    while True:
+        match = _line_re.match(text, pos)
+        line, newline = match.groups()
+        yield pos, line, newline
+        if newline is None:
+            return
+        pos = match.end()
+
+
+def read_lines(fileobj):
+    """Like split_lines, but reads fileobj (in text mode, or in binary mode,
+    in which case it's decoded as UTF-8) one line at a time."""
+    offset = 0
+    last = ''
+    while True:
+        chunk = fileobj.readline()
+        if not chunk:
+            break
+        if isinstance(chunk, bytes):
+            chunk = chunk.decode('utf-8')
+        # A chunk may hold several lines, if they end in a lone '\r' and
+        # fileobj only splits at '\n'.
+        pos = 0
+        while pos < len(chunk):
+            match = _line_re.match(chunk, pos)
+            line, newline = match.groups()
+            if newline is None:
+                # Only the last line of a file can be unterminated
+                last = line
+                break
+            yield offset + pos, line, newline
+            pos = match.end()
+        offset += pos
+    yield offset, last, None
+
+
+def syntax_error(text, pos):
+    """Returns the SyntaxError parse() raises when parsing stops at pos.
+    The message is the one parsimonious gives for an IncompleteParseError."""
+    return SyntaxError(
+        "Invalid config file syntax: Rule 'config' matched in its entirety, "
+        "but it didn't consume all the text. The non-matching portion of "
+        "the text begins with '{}' (line {}, column {}).".format(
+            text[pos:pos + 20],
+            text.count('\n', 0, pos) + 1,
+            pos - text.rfind('\n', 0, pos)))
+
+
+class _Stop(Exception):
+    """Raised internally when the input stops matching, at offset pos,
+    which is within line (at offset start, line number lineno)."""
+    def __init__(self, pos, start, line, lineno):
+        Exception.__init__(self, pos)
+        self.pos = pos
+        self.start = start
+        self.line = line
+        self.lineno = lineno
+
+    def syntax_error(self):
+        """Like syntax_error(), but with only this line at hand: the quoted
+        text doesn't extend past the end of the line."""
+        column = self.pos - self.start
+        return SyntaxError(
+            "Invalid config file syntax: Rule 'config' matched in its entirety, "
+            "but it didn't consume all the text. The non-matching portion of "
+            "the text begins with '{}' (line {}, column {}).".format(
+                self.line[column:column + 20], self.lineno, column + 1))
+
+
+# Parser states
+_START = 'start'                  # Before the first non-empty line
+_TOP_LEVEL = 'top_level'          # After a top-level assignment or include
+_SECTION_START = 'section_start'  # After a section header
+_SECTION = 'section'              # After an indented assignment
+_SKIP = 'skip'                    # After an invalid section header (see events())
+
+
+def _section_header(offset, line, newline, column, lineno):
+    """Matches a section header starting at line[column:]. Returns the
+    section's name and the name of the section it defaults to (or None),
+    or (None, None) at the end of the input."""
+    match = _section_header_re.match(line, column)
+    if match and newline is not None:
+        return match.groups()
+    if newline is None and column == len(line):
+        return None, None
+    raise _Stop(offset + column, offset, line, lineno)
+
+
+def _nested_header(line, newline, peek):
+    """Matches a section header in line, indented with spaces, that starts
+    a subsection: peek() returns the next line that isn't empty, and it has
+    to be indented more deeply. Returns the subsection's name, the name of
+    the section it defaults to (or None), and the header's column. Returns
+    None if line doesn't start a subsection."""
+    column = len(line) - len(line.lstrip(' '))
+    if not column or newline is None:
+        return None
+    match = _section_header_re.match(line, column)
+    if match is None:
+        return None
+    following = peek()
+    if following is None:
+        return None
+    following = following[1][1]
+    indentation = len(following) - len(following.lstrip(' '))
+    if column < indentation < len(following) and not following[indentation].isspace():
+        return match.group(1), match.group(2), column
+    return None
+
+
+def events(lines, errors=None):
+    """Yields the parse events for lines, an iterable of (offset, line,
+    newline) tuples like split_lines() returns. Raises _Stop.
+
+    If errors is a list, _Stops are appended to it instead of being raised,
+    and parsing carries on: see check().
+    """
+    state = _START
+    # The current top-level section's name and default, and the offset, line
+    # number, text and column of its header
+    section = default = header = None
+    # The subsections it's in: (name, column of the header), innermost last
+    nested = []
+    last_assignment = None
+    # The state to go back to after _SKIP
+    resume = None
+    # An assignment whose value may be continued on the next line:
+    # [key, the value's lines, line number, indentation]
+    continued = None
+
+    def fail(stop):
+        if errors is None:
+            raise stop
+        errors.append(stop)
+
+    # Whether a header starts a subsection depends on the line after it:
+    # peek() reads ahead, into ahead, which is read from first.
+    numbered = enumerate(lines, 1)
+    ahead = deque()
+
+    def peek():
+        for item in ahead:
+            if item[1][2] is None or _whitespace_re.match(item[1][1]).end() != len(item[1][1]):
+                return item
+        for item in numbered:
+            ahead.append(item)
+            if item[1][2] is None or _whitespace_re.match(item[1][1]).end() != len(item[1][1]):
+                return item
+        return None
+
+    def numbered_lines():
+        for item in numbered:
+            yield item
+            while ahead:
+                yield ahead.popleft()
+
+    for lineno, (offset, line, newline) in numbered_lines():
+        if continued is not None:
+            key, pieces, assignment_line, indent = continued
+            match = _continuation_re.match(line, len(indent)) if line.startswith(indent) else None
+            if match:
+                pieces.append(match.group(1))
+                if match.end() != len(line):
+                    fail(_Stop(offset + match.end(), offset, line, lineno))
+                elif match.group(1).endswith(','):
+                    continue
+            yield Event(ASSIGNMENT, key, " ".join(pieces), assignment_line)
+            continued = None
+            if match:
+                continue
+
+        if state == _SKIP:
+            if line[:1] in ('', ' ', '\t'):
+                continue
+            state = resume
+
+        if state == _START or state == _TOP_LEVEL:
+            match = _assignment_re.match(line)
+            if match and match.end() == len(line):
+                if match.group(2).endswith(','):
+                    continued = [match.group(1), [match.group(2)], lineno, '']
+                else:
+                    yield Event(ASSIGNMENT, match.group(1), match.group(2), lineno)
+                state = _TOP_LEVEL
+                continue
+            if match:
+                fail(_Stop(offset + match.end(), offset, line, lineno))
+                continue
+            match = _include_re.match(line)
+            if match and match.end() == len(line):
+                yield Event(INCLUDE, None, match.group(1), lineno)
+                state = _TOP_LEVEL
+                continue
+            if match:
+                fail(_Stop(offset + match.end(), offset, line, lineno))
+                continue
+            blank = _whitespace_re.match(line).end()
+            if blank == len(line) and (newline is not None or state == _TOP_LEVEL):
+                continue
+            # Leading empty lines don't leave any whitespace behind for
+            # the first section header to skip, but later lines do.
+            column = blank if state == _TOP_LEVEL else 0
+            try:
+                section, default = _section_header(offset, line, newline, column, lineno)
+            except _Stop as stop:
+                # Probably a section header: skip its assignments
+                fail(stop)
+                state, resume = _SKIP, state
+                continue
+            header = offset, lineno, line, column
+            state = _SECTION_START
+            continue
+
+        if state == _SECTION_START:
+            match = _indented_assignment_re.match(line)
+            if match is None:
+                blank = _whitespace_re.match(line).end()
+                if newline is not None and blank == len(line):
+                    continue
+                subsection = _nested_header(line, newline, peek)
+                if subsection is not None:
+                    name, subsection_default, column = subsection
+                    yield Event(SECTION_START, section, default, header[1])
+                    yield Event(SECTION_START, name, subsection_default, lineno)
+                    nested.append((name, column))
+                    last_assignment = None
+                    state = _SECTION
+                    continue
+                header_offset, header_lineno, header_line, column = header
+                if errors is None:
+                    raise _Stop(header_offset + column, header_offset, header_line, header_lineno)
+                if blank:
+                    # The section's first assignment is invalid
+                    fail(_Stop(offset + blank, offset, line, lineno))
+                    yield Event(SECTION_START, section, default, header_lineno)
+                    last_assignment = None
+                    state = _SECTION
+                    continue
+                # The section is empty: this line is the next section's header
+                fail(_Stop(header_offset + column, header_offset, header_line, header_lineno))
+                section = None
+                state = _SECTION
+            else:
+                yield Event(SECTION_START, section, default, header[1])
+                last_assignment = lineno
+                state = _SECTION
+                if match.end() != len(line):
+                    yield Event(ASSIGNMENT, match.group(1), match.group(2), lineno)
+                    fail(_Stop(offset + match.end(), offset, line, lineno))
+                elif match.group(2).endswith(','):
+                    continued = [match.group(1), [match.group(2)], lineno, line[:match.start(1)]]
+                else:
+                    yield Event(ASSIGNMENT, match.group(1), match.group(2), lineno)
+                continue
+
+        match = _indented_assignment_re.match(line)
+        if match and match.end() == len(line):
+            while nested and nested[-1][1] >= match.start(1):
+                yield Event(SECTION_END, nested.pop()[0], None, last_assignment)
+            if match.group(2).endswith(','):
+                continued = [match.group(1), [match.group(2)], lineno, line[:match.start(1)]]
+            else:
+                yield Event(ASSIGNMENT, match.group(1), match.group(2), lineno)
+            last_assignment = lineno
+            continue
+        if match:
+            fail(_Stop(offset + match.end(), offset, line, lineno))
+            continue
+        blank = _whitespace_re.match(line).end()
+        if blank == len(line):
+            continue
+        subsection = _nested_header(line, newline, peek) if section is not None else None
+        if subsection is not None:
+            name, subsection_default, column = subsection
+            while nested and nested[-1][1] >= column:
+                yield Event(SECTION_END, nested.pop()[0], None, last_assignment)
+            yield Event(SECTION_START, name, subsection_default, lineno)
+            nested.append((name, column))
+            continue
+        if errors is not None and blank and not _section_header_re.match(line, blank):
+            # An invalid line within the section
+            fail(_Stop(offset + blank, offset, line, lineno))
+            continue
+        while nested:
+            yield Event(SECTION_END, nested.pop()[0], None, last_assignment)
+        if section is not None:
+            yield Event(SECTION_END, section, None, last_assignment)
+        try:
+            section, default = _section_header(offset, line, newline, blank, lineno)
+        except _Stop as stop:
+            fail(stop)
+            section = None
+            state, resume = _SKIP, _SECTION
+            continue
+        header = offset, lineno, line, blank
+        state = _SECTION_START
+
+    if continued is not None:
+        key, pieces, assignment_line, _ = continued
+        yield Event(ASSIGNMENT, key, " ".join(pieces), assignment_line)
+    while nested:
+        yield Event(SECTION_END, nested.pop()[0], None, last_assignment)
+    if state == _SECTION and section is not None:
+        yield Event(SECTION_END, section, None, last_assignment)
+
+
+def iterparse(fileobj):
+    """Parses the config in fileobj, a file object in text or binary mode,
+    reading it one line at a time. Yields Event tuples:
+
+        (SECTION_START, section name, default section name or None, line number)
+        (ASSIGNMENT, key, raw value, line number)
+        (SECTION_END, section name, None, line number)
+        (INCLUDE, None, path, line number)
+
+    The events of a subsection come between its section's SECTION_START
+    and SECTION_END. Keys and section names are given as written, and values
+    are not interpolated. Memory use is bounded by the length of the longest
+    line (and the number of empty lines after a subsection's header).
+
+    Raises SyntaxError as soon as the input stops matching the grammar:
+    by then, events for the lines before that have already been yielded.
+    """
+    try:
+        for event in events(read_lines(fileobj)):
+            yield event
+    except _Stop as stop:
+        raise stop.syntax_error()
+
+
+def collect(events):
+    """Builds the list of assignment and section dicts that
+    ConfigTamerNodeVisitor would return from a stream of events."""
+    parsed = []
+    assignments = parsed
+    # The assignments of the sections enclosing the current one
+    enclosing = []
+    for event, key, value, line in events:
+        if event == ASSIGNMENT:
+            assignments.append({'key': key, 'value': value, 'line': line})
+        elif event == INCLUDE:
+            parsed.append({'include': value, 'line': line})
+        elif event == SECTION_START:
+            section = {'name': key, 'assignments': [], 'line': line}
+            if value is not None:
+                section['default'] = value
+            assignments.append(section)
+            enclosing.append(assignments)
+            assignments = section['assignments']
+        else:
+            assignments = enclosing.pop()
+    return parsed
+
+
+def parse_lines(config_string):
+    """Parses config_string into a list of assignment dicts and section dicts,
+    just like ConfigTamerNodeVisitor does. Raises SyntaxError."""
+    try:
+        return collect(events(split_lines(config_string)))
+    except _Stop as stop:
+        raise syntax_error(config_string, stop.pos)
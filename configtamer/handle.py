@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""A handle on the current version of a config, for configs that get
+reloaded while other threads are reading them.
+
+    handle = ConfigHandle(configtamer.load(path))
+    handle.watch(path)              # publishes each new version
+
+    # In a request handler
+    with handle.pin():
+        ... handle.config.db.host ...  # the same version throughout
+
+Each version is published as a Snapshot: a version number, and a Config,
+which is read-only. Publishing one is a single attribute assignment, so
+readers never take a lock, and never see a half-published version.
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from collections import namedtuple
+from contextlib import contextmanager
+
+from .watcher import Watcher
+
+
+Snapshot = namedtuple('Snapshot', ['version', 'config'])
+
+
+class ConfigHandle(object):
+    """Holds the current Snapshot of a config. Versions are numbered from 1
+    (0 if there's no config yet: config is then None)."""
+
+    def __init__(self, config=None):
+        # Only imported once there's a handle: not every program needs threads
+        import threading
+        self._snapshot = Snapshot(0 if config is None else 1, config)
+        # Only taken by writers, so that versions are numbered in order
+        self._lock = threading.Lock()
+        # Versions pinned by each thread, innermost last
+        self._local = threading.local()
+
+    def snapshot(self):
+        """Returns the Snapshot this thread has pinned, or the current one."""
+        pinned = getattr(self._local, 'pinned', None)
+        if pinned:
+            return pinned[-1]
+        return self._snapshot
+
+    @property
+    def config(self):
+        return self.snapshot().config
+
+    @property
+    def version(self):
+        return self.snapshot().version
+
+    def publish(self, config):
+        """Makes config the current version. Returns its Snapshot."""
+        with self._lock:
+            snapshot = Snapshot(self._snapshot.version + 1, config)
+            self._snapshot = snapshot
+        return snapshot
+
+    @contextmanager
+    def pin(self):
+        """Pins the current version for this thread, for the duration of a
+        with block: config and version don't change within it, whatever is
+        published in the meantime. Yields the Snapshot. Pins can be nested:
+        inner ones keep the version the outermost one pinned."""
+        pinned = getattr(self._local, 'pinned', None)
+        if pinned is None:
+            pinned = self._local.pinned = []
+        snapshot = pinned[-1] if pinned else self._snapshot
+        pinned.append(snapshot)
+        try:
+            yield snapshot
+        finally:
+            pinned.pop()
+
+    def watch(self, path, **watch_options):
+        """Watches the config file at path (see watch()), and publishes each
+        new version of it. Also publishes it right away. Returns the Watcher,
+        already started."""
+        watcher = Watcher(path, lambda config, changes: self.publish(config), **watch_options)
+        # Before any reload can be published
+        self.publish(watcher.config)
+        return watcher.start()
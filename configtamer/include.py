@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""Including config fragments: "@include path" at the top level of a config.
+
+    @include common/logging.config
+    @include common/databases.config
+
+    service: billing
+
+A fragment is parsed and interpolated on its own, so its values can't
+reference the including config's, but the including config's values can
+reference the fragment's. Its keys and sections are added where the
+directive is; keys defined again later (in the including config, or in a
+later fragment) override them, and a section defined again later is merged
+with the included one.
+
+Fragments are kept in a process-wide cache, keyed by their resolved path and
+the hash of their contents: a fragment that many configs include is only
+parsed once, for as long as it doesn't change.
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import io
+import os
+import re
+
+from .cache import content_hash
+from .compat import allocate_lock
+
+
+# An include directive, as in fastparser._include_re, but anywhere in a text
+include_re = re.compile(r'^@include[ \t]', re.M)
+
+# {resolved path: (content hash, Config, [(path, Config) for each fragment it includes])}
+_fragments = {}
+_lock = allocate_lock()
+
+
+class IncludeError(Exception):
+    """A fragment couldn't be included: it can't be read, or fragments
+    include each other in a cycle."""
+
+
+class Includer(object):
+    """Resolves the include directives of a config, relative to directory
+    (the current directory, by default). Calling it with a path (as written
+    in the directive) and the directive's line number returns the fragment,
+    as a Config.
+
+    chain is the resolved paths of the fragments being included, the
+    outermost first, and included is the list of (resolved path, Config) of
+    each fragment included so far.
+    """
+
+    def __init__(self, directory=None, chain=()):
+        self.directory = directory
+        self.chain = chain
+        self.included = []
+
+    def __call__(self, path, line=None):
+        path = os.path.expanduser(path)
+        if self.directory is not None:
+            path = os.path.join(self.directory, path)
+        path = os.path.realpath(path)
+        config = fragment(path, self.chain, line)
+        self.included.append((path, config))
+        return config
+
+
+def fragment(path, chain=(), line=None):
+    """Returns the fragment at path (already resolved), parsed and
+    interpolated as a Config. It's only parsed again if it (or a fragment it
+    includes) changed. Raises IncludeError, and parse errors."""
+    if path in chain:
+        cycle = chain[chain.index(path):] + (path,)
+        raise IncludeError("Circular include: {}".format(" -> ".join(cycle)))
+    try:
+        with io.open(path, 'rb') as fragment_file:
+            data = fragment_file.read()
+    except (IOError, OSError) as exc:
+        raise IncludeError("Can't include '{}'{}: {}".format(
+            path, " (line {})".format(line) if line is not None else "", exc))
+    digest = content_hash(data)
+
+    with _lock:
+        entry = _fragments.get(path)
+    if entry is not None and entry[0] == digest:
+        config, included = entry[1:]
+        # Fragments it includes are checked (and cached) in turn
+        if all(fragment(nested, chain + (path,)) is nested_config
+               for nested, nested_config in included):
+            return config
+
+    # parser imports this module
+    from .parser import parse_lines, process_config
+    includer = Includer(os.path.dirname(path), chain + (path,))
+    config = process_config(parse_lines(data.decode('utf-8')), include=includer)
+    with _lock:
+        _fragments[path] = (digest, config, includer.included)
+    return config
+
+
+def clear():
+    """Empties the fragment cache."""
+    with _lock:
+        _fragments.clear()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+"""Incremental re-parsing of edited configs, one top-level section at a time.
+
+The text is split at its top-level section headers, and each section's text
+is hashed. A section whose text is unchanged, and which doesn't depend on
+anything that did change (the sections it defaults to or references, and
+the top-level values it references), is reused as is: the new Config holds
+the very same section object as the old one. Only the other sections, and
+the ones they need to be interpolated, are parsed again.
+
+parse(text, sections=[...]) goes through the same chunks, and only parses
+the requested sections, the top level and the sections they need.
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import re
+import weakref
+from collections import namedtuple
+
+from .config import Config, LazyConfig
+from .fastparser import parse_lines
+from .include import Includer, include_re
+from .interpolation import InterpolationError, Scope, add_items, link_defaults, reference_re
+from .parser import parse, build_config
+
+
+# A top-level section header, as in fastparser._section_header_re. The grammar
+# also accepts indented headers (after the first line): those don't start a
+# new chunk, which _reparse() has to look out for.
+header_re = re.compile(
+    r'^([a-z0-9][a-z0-9_]*)[ \t]*'
+    r'(?:\[[ \t]*default[ \t]*:[ \t]*([a-z0-9][a-z0-9_]*)[ \t]*\][ \t]*)?'
+    r':[ \t]*(?=[\r\n]|\Z)', re.I | re.M)
+
+# A piece of config text: the top-level assignments (name is None), or a
+# top-level section. line is the line number it starts on, and digest the
+# SHA-256 of its text (None if split_chunks() was asked not to hash it).
+Chunk = namedtuple('Chunk', ['name', 'default', 'text', 'line', 'digest'])
+
+_MISSING = object()
+
+# {id(config): (weak reference to config, {section name: digest})}: the
+# digest of each section's text, for the configs parse(incremental=True) and
+# reparse() returned, so that reparse() can tell which sections of an edited
+# text have changed. Only the digests are kept, not the (possibly big) text.
+# Configs aren't hashable (they're mappings), hence the ids.
+_digests = {}
+
+
+def split_chunks(text, digests=True):
+    """Splits text at its top-level section headers. Returns a list of
+    Chunks, starting with the top-level assignments. Each one is hashed,
+    unless digests is false."""
+    chunks = []
+    name = default = None
+    start = 0
+    line = 1
+    for match in header_re.finditer(text):
+        chunks.append(_chunk(name, default, text[start:match.start()], line, digests))
+        line += _count_lines(chunks[-1].text)
+        name, default = match.groups()
+        name = name.lower()
+        default = default.lower() if default is not None else None
+        start = match.start()
+    chunks.append(_chunk(name, default, text[start:], line, digests))
+    return chunks
+
+
+def _chunk(name, default, text, line, digest):
+    if digest:
+        # Only needed for reparse(), not when importing configtamer
+        import hashlib
+        digest = hashlib.sha256(text.encode('utf-8')).digest()
+    else:
+        digest = None
+    return Chunk(name, default, text, line, digest)
+
+
+def _count_lines(text):
+    # Any of '\r\n', '\n' and '\r' ends a line
+    return text.count('\n') + text.count('\r') - text.count('\r\n')
+
+
+def reparse(old_config, new_text, flatten_defaults=False, directory=None):
+    """Parses new_text, an edited version of the text old_config was parsed
+    from (by parse(..., incremental=True) or reparse()). Returns a new Config,
+    which shares each top-level section that's unaffected by the edit with
+    old_config.
+
+    Gives the same result, and raises the same errors, as parse(new_text).
+    If old_config wasn't returned by parse(..., incremental=True) or
+    reparse(), that's all it does.
+    Neither does it for texts with include directives, which are looked for
+    relative to directory (see parse()).
+    """
+    old_digests = _old_digests(old_config)
+    config = None
+    if old_digests is not None:
+        try:
+            config = _reparse(old_config, old_digests, new_text)
+        except (SyntaxError, InterpolationError):
+            # Let parse() report it, exactly as it would have
+            pass
+    if config is None:
+        return parse(new_text, flatten_defaults=flatten_defaults, directory=directory, incremental=True)
+    remember_digests(config, new_text)
+    return config
+
+
+def remember_digests(config, config_string):
+    """Remembers the digests of the sections of config_string, which config
+    was parsed from."""
+    key = id(config)
+
+    def forget(reference):
+        if _digests.get(key, (None, None))[0] is reference:
+            del _digests[key]
+
+    digests = dict((chunk.name, chunk.digest) for chunk in split_chunks(config_string)[1:])
+    _digests[key] = (weakref.ref(config, forget), digests)
+
+
+def _old_digests(config):
+    """Returns the digests remember_digests() remembered for config, or None."""
+    reference, digests = _digests.get(id(config), (None, None))
+    if reference is None or reference() is not config:
+        return None
+    return digests
+
+
+def _reparse(old_config, old_digests, new_text):
+    """Does the actual work for reparse(). Returns None if new_text is
+    better off parsed as a whole."""
+    if new_text.count('\r') != new_text.count('\r\n'):
+        # '^' doesn't match after a lone '\r', so old Mac line endings
+        # would throw split_chunks() off
+        return None
+    if include_re.search(new_text):
+        # Included fragments may have changed too
+        return None
+    if set(old_digests) != set(key for key in old_config if isinstance(old_config[key], Config)):
+        # Some chunks hold more than one section (with indented headers):
+        # reusing them as a whole isn't worth the trouble
+        return None
+    chunks = split_chunks(new_text)
+    top = chunks.pop(0)
+    sections = {}
+    for chunk in chunks:
+        if chunk.name in sections:
+            # Which one wins is up to parse()
+            return None
+        sections[chunk.name] = chunk
+
+    root = Scope()
+    if not _load(root, [top], sections):
+        return None
+    new_values = dict((key, root.resolve(key)) for key in root.assignments)
+
+    old_values = {}
+
+    def top_level_changed(key):
+        if key not in old_values:
+            old_values[key] = _old_value(old_config, key)
+        return new_values.get(key, _MISSING) != old_values[key]
+
+    # Which sections need to be rebuilt: the edited ones, and those that
+    # depend on them, directly or not
+    dirty = set()
+    dependents = {}
+    for chunk in chunks:
+        sections_used, keys_used = _references(chunk, sections)
+        for name in sections_used:
+            dependents.setdefault(name, []).append(chunk.name)
+        if (old_digests.get(chunk.name) != chunk.digest or
+                any(name not in sections for name in sections_used) or
+                any(top_level_changed(key) for key in keys_used)):
+            dirty.add(chunk.name)
+    pending = list(dirty)
+    while pending:
+        for name in dependents.get(pending.pop(), ()):
+            if name not in dirty:
+                dirty.add(name)
+                pending.append(name)
+
+    if not _load(root, [sections[name] for name in dirty], sections):
+        return None
+
+    items = [(key, new_values[key]) for key in root.assignments]
+    for chunk in chunks:
+        if chunk.name in dirty:
+            items.append((chunk.name, build_config(root.sections[chunk.name])))
+        else:
+            items.append((chunk.name, old_config[chunk.name]))
+    return Config(items)
+
+
+def parse_sections(config_string, names, engine='fast', lazy=False, directory=None):
+    """Does the work for parse(config_string, sections=names). Returns a
+    Config holding only the top-level sections in names. Raises KeyError if
+    one of them isn't defined.
+
+    Only the chunks of those sections, of the top level, and of the sections
+    they need are parsed, so syntax errors in the others go unnoticed. Texts
+    that can't be split into chunks (and the "peg" engine) are parsed whole.
+    """
+    names = [name.lower() for name in names]
+    root = None
+    if engine != 'peg':
+        try:
+            root = _load_sections(config_string, names, Includer(directory))
+        except SyntaxError:
+            # Let parse() report it, with the right line number
+            pass
+    if root is None:
+        config = parse(config_string, engine=engine, lazy=lazy, directory=directory)
+        sections = dict((name, config[name]) for name in config if isinstance(config[name], Config))
+    else:
+        sections = root.sections
+    items = []
+    for name in names:
+        if name not in sections:
+            raise KeyError("No such section: '{}'".format(name))
+        section = sections[name]
+        if root is not None:
+            section = LazyConfig(section) if lazy else build_config(section)
+        items.append((name, section))
+    return Config(items)
+
+
+def _load_sections(config_string, names, include):
+    """Parses the top level of config_string, the chunks of the sections
+    in names, and the ones they need. Returns the root Scope, or None if
+    config_string is better off parsed as a whole."""
+    if config_string.count('\r') != config_string.count('\r\n'):
+        return None
+    chunks = split_chunks(config_string, digests=False)
+    top = chunks.pop(0)
+    sections = {}
+    for chunk in chunks:
+        if chunk.name in sections:
+            return None
+        sections[chunk.name] = chunk
+    root = Scope()
+    if not _load(root, [top], sections, include):
+        return None
+    if any(name not in sections and name not in root.sections for name in names):
+        # It may be in another chunk, after an indented header
+        return None
+    if not _load(root, [sections[name] for name in names if name in sections], sections):
+        return None
+    return root
+
+
+def _load(root, pending, sections, include=None):
+    """Parses a list of chunks into root, along with every section they need
+    to be interpolated. Returns False if a chunk turns out to hold more (or
+    less) than a single section, or any section for the top level."""
+    while pending:
+        chunk = pending.pop()
+        section = root.sections.get(chunk.name) if chunk.name is not None else None
+        if section is not None and not section.included:
+            continue
+        items = parse_lines(chunk.text)
+        names = [item['name'] for item in items if 'name' in item]
+        if names != ([chunk.name] if chunk.name is not None else []):
+            return False
+        add_items(root, _shift(items, chunk.line - 1), include)
+        pending.extend(sections[name] for name in _references(chunk, sections)[0]
+                       if name in sections)
+    link_defaults(root)
+    return True
+
+
+def _references(chunk, sections):
+    """Returns the names of the sections chunk depends on (including the
+    sections it defaults to, down the chain) and the plain keys it
+    references, in the sections it defaults to too: those may be top-level
+    keys. This looks at the raw text, so it may overestimate."""
+    sections_used = set()
+    keys_used = set()
+    chain = set()
+    while chunk is not None:
+        for reference in set(reference_re.findall(chunk.text)):
+            names = reference.lower().split(".")
+            if len(names) > 1:
+                sections_used.add(names[0])
+            else:
+                keys_used.add(names[0])
+        chain.add(chunk.name)
+        if chunk.default is None or chunk.default in chain:
+            break
+        sections_used.add(chunk.default)
+        chunk = sections.get(chunk.default)
+    return sections_used, keys_used
+
+
+def _old_value(config, key):
+    """Returns the top-level value of key in config, or _MISSING."""
+    try:
+        value = config[key]
+    except (KeyError, InterpolationError):
+        return _MISSING
+    return _MISSING if isinstance(value, Config) else value
+
+
+def _shift(items, lines):
+    """Adds lines to the line numbers in a list of assignment and section dicts."""
+    for item in items:
+        if item.get('line') is not None:
+            item['line'] += lines
+        if 'assignments' in item:
+            _shift(item['assignments'], lines)
+    return items
@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+"""Interpolation of {key} references in config values.
+
+Values are resolved in dependency order, and each one is interpolated at
+most once: the total cost is linear in the number of keys and references,
+regardless of the order they appear in. Chains of references are followed
+with an explicit stack, so they can be arbitrarily deep.
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import re
+
+from .compat import Mapping
+from .values import Value
+
+reference_re = re.compile(r'\{([^}]+)\}')
+
+
+class InterpolationError(Exception):
+    """A config value couldn't be interpolated."""
+
+
+class MissingKeyError(InterpolationError, KeyError):
+    """A config value references a key that isn't defined."""
+    def __init__(self, reference, path, line):
+        InterpolationError.__init__(
+            self, "Key '{}' is not defined (referenced by '{}'{})".format(
+                reference, path, _on_line(line)))
+        self.reference = reference
+        self.path = path
+        self.line = line
+
+    def __reduce__(self):
+        return (self.__class__, (self.reference, self.path, self.line))
+
+    # KeyError would quote the whole message
+    __str__ = InterpolationError.__str__
+
+
+class CircularReferenceError(InterpolationError):
+    """Config values reference each other in a cycle."""
+    def __init__(self, cycle):
+        """cycle is a list of (path, line) tuples, each referencing the next,
+        and the last one referencing the first."""
+        InterpolationError.__init__(
+            self, "Circular reference: {}".format(" -> ".join(
+                ["'{}'{}".format(path, _on_line(line)) for path, line in cycle] +
+                ["'{}'".format(cycle[0][0])])))
+        self.cycle = cycle
+
+    def __reduce__(self):
+        return (self.__class__, (self.cycle,))
+
+
+def _on_line(line):
+    return " on line {}".format(line) if line is not None else ""
+
+
+class Scope(object):
+    """The assignments and subsections of a section, or of the top level.
+
+    Each assignment is kept as parsed until its value is first resolved, and
+    the interpolated value is then remembered.
+
+    A section can default to another one ("section [default: other]:"): it
+    then has every key the other one has, too. Inherited values aren't
+    copied, but looked up along the chain of defaults. They're interpolated
+    in the inheriting section, so their references may resolve differently
+    there; values without references are simply shared.
+    """
+    def __init__(self, name=None, parent=None, line=None, default_name=None):
+        self.name = name
+        self.parent = parent
+        self.line = line
+        # {key: (raw value, line number)}. Keys are lowercase.
+        self.assignments = {}
+        # {section name: Scope}. Names are lowercase.
+        self.sections = {}
+        # {key: interpolated value}, for inherited keys too
+        self.resolved = {}
+        # The Scope this one defaults to, once link_defaults() has found it
+        self.default_name = default_name
+        self.default = None
+        # Whether this section came from an included fragment (see add_config())
+        self.included = False
+
+    def path(self, key=None):
+        """Returns the dotted path to this scope, or to one of its keys."""
+        names = [key] if key is not None else []
+        scope = self
+        while scope.parent is not None:
+            names.append(scope.name)
+            scope = scope.parent
+        return ".".join(reversed(names))
+
+    def root(self):
+        scope = self
+        while scope.parent is not None:
+            scope = scope.parent
+        return scope
+
+    def add_assignment(self, key, value, line=None):
+        key = key.lower()
+        self.assignments[key] = (value, line)
+        # It may override an included value
+        self.resolved.pop(key, None)
+
+    def add_resolved(self, key, value, line=None):
+        """Adds an already interpolated value."""
+        self.assignments[key] = (value, line)
+        self.resolved[key] = value
+
+    def add_section(self, name, line=None, default_name=None):
+        # Subclasses' sections are of the same subclass
+        section = self.__class__(name.lower(), self, line,
+                                 default_name.lower() if default_name is not None else None)
+        self.sections[section.name] = section
+        return section
+
+    def find(self, key):
+        """Returns the Scope that defines key: this one, or the first one
+        along the chain of defaults that does. None if there's none."""
+        scope = self
+        while scope is not None:
+            if key in scope.assignments:
+                return scope
+            scope = scope.default
+        return None
+
+    def raw(self, key):
+        """Returns the (raw value, line number) assigned to key,
+        which may be inherited."""
+        return self.find(key).assignments[key]
+
+    def keys(self):
+        """Returns every key this scope has, its own ones first, then the
+        inherited ones."""
+        if self.default is None:
+            return list(self.assignments)
+        keys = []
+        seen = set()
+        scope = self
+        while scope is not None:
+            for key in scope.assignments:
+                if key not in seen:
+                    seen.add(key)
+                    keys.append(key)
+            scope = scope.default
+        return keys
+
+    def lookup(self, reference):
+        """Finds the key a {reference} points to, as seen from this scope.
+        Returns a (scope, key) tuple, or None if it isn't defined.
+
+        A plain key is looked up in this scope, then in each enclosing one.
+        A dotted key (section.subsection.key) is looked up from the top level.
+        """
+        names = reference.lower().split(".")
+        key = names.pop()
+        if names:
+            scope = self.root()
+            for name in names:
+                scope = scope.sections.get(name)
+                if scope is None:
+                    return None
+            return (scope, key) if scope.find(key) is not None else None
+
+        scope = self
+        while scope is not None:
+            if scope.find(key) is not None:
+                return scope, key
+            scope = scope.parent
+        return None
+
+    def resolve(self, key):
+        """Returns the interpolated value of key, resolving every value it
+        (directly or indirectly) references along the way."""
+        if key in self.resolved:
+            return self.resolved[key]
+
+        # Each frame is [scope, key, parts, index]: parts alternates literal
+        # text and references, and index is the next part to look at.
+        stack = []
+        in_progress = set()
+
+        def push(scope, key):
+            value, line = scope.raw(key)
+            if '{' not in value:
+                # The same for every section that inherits it: they share it
+                owner = scope.find(key)
+                if key not in owner.resolved:
+                    owner.resolved[key] = Value(value)
+                scope.resolved[key] = owner.resolved[key]
+                return
+            stack.append([scope, key, reference_re.split(value), 1])
+            in_progress.add((scope, key))
+
+        push(self, key)
+        while stack:
+            frame = stack[-1]
+            scope, key, parts, index = frame
+            while index < len(parts):
+                target = scope.lookup(parts[index])
+                if target is None:
+                    raise MissingKeyError(parts[index], scope.path(key),
+                                          scope.raw(key)[1])
+                target_scope, target_key = target
+                if target_key not in target_scope.resolved:
+                    if target in in_progress:
+                        raise self._cycle(stack, target)
+                    break
+                parts[index] = target_scope.resolved[target_key]
+                index += 2
+            frame[3] = index
+            if index < len(parts):
+                push(target_scope, target_key)
+                continue
+            scope.resolved[key] = Value("".join(parts))
+            in_progress.discard((scope, key))
+            stack.pop()
+
+        return self.resolved[key]
+
+    @staticmethod
+    def _cycle(stack, target):
+        frames = [(scope, key) for scope, key, _, _ in stack]
+        cycle = frames[frames.index(target):]
+        return CircularReferenceError(
+            [(scope.path(key), scope.raw(key)[1]) for scope, key in cycle])
+
+
+def build_scopes(parsed_config, include=None):
+    """Builds a Scope tree from a list of assignment and section dicts,
+    as returned by the parser engines. include is called with the path and
+    line number of each include directive, and returns the included Config
+    (see include.Includer)."""
+    scope = add_items(Scope(), parsed_config, include)
+    link_defaults(scope)
+    return scope
+
+
+def add_items(scope, items, include=None):
+    for item in items:
+        if 'name' in item:
+            section = scope.sections.get(item['name'].lower())
+            if section is not None and section.included:
+                # Extend the included section
+                default = item.get('default')
+                section.included = False
+                section.line = item.get('line')
+                section.default_name = default.lower() if default is not None else None
+            else:
+                section = scope.add_section(item['name'], item.get('line'), item.get('default'))
+            add_items(section, item['assignments'])
+        elif 'include' in item:
+            if include is None:
+                raise ValueError("Can't include '{}': no includer given".format(item['include']))
+            add_config(scope, include(item['include'], item.get('line')), item.get('line'))
+        else:
+            scope.add_assignment(item['key'], item['value'], item.get('line'))
+    return scope
+
+
+def add_config(scope, config, line=None):
+    """Adds the keys and sections of an interpolated Config to scope, as if
+    they were assigned on line. Sections scope already has are merged."""
+    for key in config:
+        value = config[key]
+        if not isinstance(value, Mapping):
+            scope.add_resolved(key, value, line)
+            continue
+        section = scope.sections.get(key)
+        if section is None or not section.included:
+            section = scope.add_section(key, line)
+            section.included = True
+        add_config(section, value, line)
+    return scope
+
+
+def link_defaults(scope):
+    """Links each section in a Scope tree to the (sibling) section it
+    defaults to. Raises MissingKeyError if there's no such section,
+    and CircularReferenceError if sections default to each other."""
+    for section in scope.sections.values():
+        if section.default_name is not None:
+            section.default = scope.sections.get(section.default_name)
+            if section.default is None:
+                raise MissingKeyError(section.default_name, section.path(), section.line)
+    for section in scope.sections.values():
+        chain = []
+        default = section
+        while default is not None:
+            if default in chain:
+                cycle = chain[chain.index(default):]
+                raise CircularReferenceError([(s.path(), s.line) for s in cycle])
+            chain.append(default)
+            default = default.default
+        link_defaults(section)
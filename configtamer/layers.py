@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+"""Layering configs: a base file, an environment-specific one, environment
+variables, command-line overrides... each layer overriding the ones before.
+
+    layers = configtamer.layered([
+        ('base', configtamer.load('base.config')),
+        ('production', configtamer.load('production.config')),
+        ('environ', configtamer.environ_source('MYAPP_')),
+        ('command line', configtamer.overrides_source(args.set)),
+    ])
+    layers.config.db.host           # an ordinary Config
+    layers.provenance('db.host')    # 'environ'
+
+The merged Config is built once, so reading it costs nothing more than
+reading any Config. Each layer is kept flattened to {dotted path: value},
+and for each path, the layers that define it: when a layer is replaced,
+only the paths it defines (before or after) are looked at again, and only
+the sections holding them are built anew. The others are shared with the
+previous merged Config.
+
+Layers are merged once interpolated: a value from an upper layer replaces
+a lower layer's value, but doesn't change the values that referred to it.
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import os
+
+from .compat import Mapping, string_types
+from .config import Config
+from .values import Value
+
+
+def layered(sources):
+    """Merges sources, lowest first. Each source is a Mapping (a Config, or
+    a dict whose keys can be dotted paths, e.g. {'db.host': 'localhost'}),
+    or a (name, Mapping) pair. Unnamed layers are named after their index.
+    Returns a Layered object."""
+    return Layered(sources)
+
+
+def environ_source(prefix, environ=None, separator='__'):
+    """Returns the variables in environ (os.environ by default) whose names
+    start with prefix, as a source for layered(): MYAPP_DB__HOST=localhost
+    (with prefix 'MYAPP_') is {'db.host': 'localhost'}."""
+    if environ is None:
+        environ = os.environ
+    return dict((name[len(prefix):].replace(separator, '.').lower(), value)
+                for name, value in environ.items()
+                if name.startswith(prefix) and len(name) > len(prefix))
+
+
+def overrides_source(overrides):
+    """Returns overrides, a list of "path=value" strings (e.g. from the
+    command line), as a source for layered(). Raises ValueError for those
+    without an '='."""
+    source = {}
+    for override in overrides:
+        path, separator, value = override.partition('=')
+        if not separator or not path.strip():
+            raise ValueError("Invalid override (should be path=value): '{}'".format(override))
+        source[path.strip()] = value.strip()
+    return source
+
+
+class Layered(object):
+    """Configs merged in layers (see layered()). config is the merged
+    Config."""
+
+    def __init__(self, sources):
+        # [name, {path: value}] for each layer, lowest first
+        self._layers = []
+        # {path: indexes of the layers that define it, in order}
+        self._defined = {}
+        # {section path: how many (layer, path) definitions it holds}. The
+        # top level's path is "".
+        self._counts = {"": 0}
+        # {section path: {key: None}}: the keys of each section, in order
+        self._children = {"": {}}
+        # {section path: merged Config}
+        self._configs = {}
+        for index, source in enumerate(sources):
+            if isinstance(source, tuple):
+                name, source = source
+            else:
+                name = index
+            self._layers.append([name, {}])
+            self._add(index, _flatten(source))
+        self._rebuild(set(self._counts))
+
+    @property
+    def config(self):
+        return self._configs[""]
+
+    def provenance(self, path):
+        """Returns the name of the layer the value at path comes from.
+        Raises KeyError if there's no such value."""
+        return self._layers[self._defined[path.lower()][-1]][0]
+
+    def layers_of(self, path):
+        """Returns the names of every layer that defines path, lowest first."""
+        return [self._layers[index][0] for index in self._defined.get(path.lower(), ())]
+
+    def update(self, layer, source):
+        """Replaces a layer (given by index or name) with source. Returns
+        the new merged Config. Raises ValueError if source clashes with the
+        other layers, leaving everything as it was."""
+        index = self._index(layer)
+        old = self._layers[index][1]
+        new = _flatten(source)
+        self._remove(index)
+        try:
+            self._add(index, new)
+        except ValueError:
+            self._add(index, old)
+            raise
+        dirty = set()
+        for path in set(old) | set(new):
+            dirty.update(_sections_of(path))
+        self._rebuild(dirty)
+        return self.config
+
+    def _index(self, layer):
+        if isinstance(layer, int) and 0 <= layer < len(self._layers):
+            return layer
+        for index, (name, _) in enumerate(self._layers):
+            if name == layer:
+                return index
+        raise KeyError("No such layer: {!r}".format(layer))
+
+    def _add(self, index, flat):
+        """Adds the paths of a layer. Raises ValueError, before changing
+        anything, if one is a value in a layer and a section in another."""
+        name = self._layers[index][0]
+        sections = set(section for path in flat for section in _sections_of(path))
+        for path in flat:
+            if path in self._counts or path in sections:
+                raise ValueError("'{}' is a value in layer {!r}, but a section too".format(path, name))
+        for section in sections:
+            if section in self._defined:
+                raise ValueError("'{}' is a section in layer {!r}, but a value in others".format(
+                    section, name))
+        self._layers[index][1] = flat
+        for path in flat:
+            indexes = self._defined.get(path)
+            if indexes is None:
+                indexes = self._defined[path] = []
+                self._link(path)
+            indexes.append(index)
+            indexes.sort()
+            for section in _sections_of(path):
+                self._counts[section] += 1
+
+    def _remove(self, index):
+        flat = self._layers[index][1]
+        for path in flat:
+            indexes = self._defined[path]
+            indexes.remove(index)
+            if not indexes:
+                del self._defined[path]
+                self._unlink(path)
+            for section in _sections_of(path):
+                self._counts[section] -= 1
+                if not self._counts[section] and section:
+                    del self._counts[section]
+                    del self._children[section]
+                    self._unlink(section)
+        self._layers[index][1] = {}
+
+    def _link(self, path):
+        """Adds path to its section, and the sections to theirs if they're new."""
+        while path:
+            section, _, key = path.rpartition('.')
+            new = section not in self._children
+            if new:
+                self._children[section] = {}
+                self._counts[section] = 0
+            self._children[section][key] = None
+            if not new:
+                return
+            path = section
+
+    def _unlink(self, path):
+        section, _, key = path.rpartition('.')
+        children = self._children.get(section)
+        if children is not None:
+            children.pop(key, None)
+
+    def _rebuild(self, dirty):
+        """Builds the merged Configs of the sections in dirty (and of those
+        that are gone), deepest first."""
+        for section in sorted(dirty, key=lambda section: -section.count('.') - bool(section)):
+            if section not in self._counts:
+                self._configs.pop(section, None)
+                continue
+            prefix = section + '.' if section else ''
+            items = []
+            for key in self._children[section]:
+                path = prefix + key
+                indexes = self._defined.get(path)
+                if indexes is None:
+                    items.append((key, self._configs[path]))
+                else:
+                    items.append((key, self._layers[indexes[-1]][1][path]))
+            self._configs[section] = Config(items)
+
+
+def _sections_of(path):
+    """Returns the paths of the sections path is in, the top level ("")
+    first."""
+    names = path.split('.')
+    return [""] + [".".join(names[:end]) for end in range(1, len(names))]
+
+
+def _flatten(source, prefix=""):
+    """Returns {lowercase dotted path: value} for each value in source, a
+    Mapping whose keys may be dotted paths, and whose values may be
+    Mappings (sections)."""
+    if not isinstance(source, Mapping):
+        raise TypeError("Layers should be mappings, not {}".format(type(source).__name__))
+    flat = {}
+    for key in source:
+        value = source[key]
+        path = prefix + key.lower()
+        if isinstance(value, Mapping):
+            flat.update(_flatten(value, path + "."))
+        else:
+            if isinstance(value, string_types) and not isinstance(value, Value):
+                value = Value(value)
+            flat[path] = value
+    return flat
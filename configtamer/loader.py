@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""Loading configs from files."""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import io
+import os
+
+from .parser import parse
+from .cache import ParseCache, content_hash, _fingerprint
+from .include import include_re
+from .buffers import parse_buffer, map_file
+
+
+# The options of parse() that parse_buffer() takes too
+_BUFFER_OPTIONS = frozenset(['lazy', 'flatten_defaults', 'directory'])
+
+
+def read(path):
+    """Returns the contents of the file at path, as bytes."""
+    with io.open(path, 'rb') as config_file:
+        return config_file.read()
+
+
+def load(path, cache=False, mmap=False, **parse_options):
+    """Parses the config file at path. Returns a Config object.
+
+    If cache is true, processed configs are kept in an on-disk cache (see
+    cache.py): loading a file that has already been loaded skips parsing and
+    interpolation entirely, and a file that hasn't changed since it was last
+    loaded isn't even read in full. cache can also be a ParseCache, to use a
+    different cache directory or size limit than the defaults.
+
+    Any other arguments are passed on to parse(). A cached config is always
+    fully interpolated, even if lazy=True. Fragments are included relative
+    to the file's directory, and configs that include any aren't cached on
+    disk (they'd go stale when a fragment changes). Neither are configs
+    parsed only in part, with sections=[...]: the cache is left alone.
+
+    If mmap is true (and cache isn't), the file is memory-mapped and parsed
+    with parse_buffer() rather than read into a string: with lazy=True, that
+    keeps only the values that are read in memory. parse_buffer() only takes
+    lazy, flatten_defaults and directory: with any other option (engine,
+    stats, sections...), mmap is ignored.
+    """
+    parse_options.setdefault('directory', os.path.dirname(os.path.abspath(path)))
+    if mmap and not cache and set(parse_options) <= _BUFFER_OPTIONS:
+        return parse_buffer(map_file(path), **parse_options)
+    if not cache or parse_options.get('sections') is not None:
+        return parse(read(path).decode('utf-8'), **parse_options)
+
+    if not isinstance(cache, ParseCache):
+        cache = ParseCache()
+
+    stat = os.stat(path)
+    digest = cache.lookup_path(path, stat)
+    if digest is not None:
+        config = cache.get(digest)
+        if config is not None:
+            return config
+
+    data = read(path)
+    digest = content_hash(data)
+    config = cache.get(digest)
+    if config is None:
+        parse_options['lazy'] = False
+        config_string = data.decode('utf-8')
+        config = parse(config_string, **parse_options)
+        if include_re.search(config_string):
+            return config
+        cache.put(digest, config)
+    # Only trust the fingerprint if the file didn't change while we read it
+    if _fingerprint(os.stat(path)) == _fingerprint(stat):
+        cache.remember_path(path, stat, digest)
+    return config
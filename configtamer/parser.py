@@ -5,46 +5,11 @@ from __future__ import print_function
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
-import sys
-
-import parsimonious
-from parsimonious.grammar import Grammar
-from parsimonious.nodes import NodeVisitor
-
-from .config import Config
-from .compat import raise_
-
-
-grammar = Grammar(
-    r"""
-    config               = empty_lines? top_level? sections? (newline trailing_empty_lines)?
-
-    top_level            = (assignment newline lines) / assignment
-    lines                = (line newline lines) / line
-    line                 = assignment / empty_line
-
-    sections             = (section sections) / section
-    section              = section_header newline empty_lines? indented_assignments
-    section_header       = section_name whitespace_inline* assignment_colon whitespace_inline*
-    section_name         = key
-    indented_assignments = (indented_assignment newline indented_lines) / indented_assignment
-    indented_lines       = (indented_line newline indented_lines) / indented_line
-    indented_line        = indented_assignment / empty_line
-    indented_assignment  = " "+ assignment
-
-    assignment           = key whitespace_inline* assignment_op whitespace_inline* value whitespace_inline*
-    key                  = ~"[a-z0-9][a-z0-9_]*"i
-    # This seems a little too permissive, but we'll get to that.
-    value                = ~"[^\s]([^\r\n]*[^\s])?"
-    assignment_colon     = ":"
-    assignment_equals    = "="
-    assignment_op        = assignment_colon / assignment_equals
-    empty_lines          = (empty_line newline empty_lines) / (empty_line newline)
-    trailing_empty_lines = (empty_line newline empty_lines) / empty_line
-    empty_line           = whitespace_inline*
-    whitespace_inline    = " " / "\t"
-    newline              = "\r\n" / "\n" / "\r"
-    """)
+from .config import Config, LazyConfig
+from .fastparser import parse_lines, split_lines
+from .include import Includer
+from .interpolation import build_scopes
+from .stats import count_nodes, count_items, count_interpolations
 
 
 def flatten(items):
@@ -58,111 +23,142 @@ def flatten(items):
     return flat
 
 
-class ConfigTamerNodeVisitor(NodeVisitor):
-    def visit_config(self, node, visited_children):
-        # each of visited_children is a >=0 list of
-        # {key: "key", value: "value"} or
-        # {'name': "section_name", "assignments": [...]}
-        # dicts representing assignments and sections (or None, representing empty matches)
-        assignments = flatten(visited_children)
-        return assignments
-
-    def visit_line(self, node, visited_children):
-        # visited_children is a list with either a single element,
-        # a dict {key: "key", value: "value"} representing assignments,
-        # or an empty list representing an empty line.
-        assert len(visited_children) == 1, "Expected only one child in a line: {}".format(visited_children)
-        return visited_children
-
-    def visit_assignment(self, node, visited_children):
-        # After flattening, visited_children are one dict with "key"
-        # and one with "value"
-        items = [pair for d in flatten(visited_children)
-                  for pair in d.items()]
-        merged = dict(items)
-        return merged
-
-    def visit_section_header(self, node, visited_children):
-        # visited_children, flattened, should contain a single element,
-        # a {key: section_name} dict representing the section name
-        dicts = flatten(visited_children)
-        assert len(dicts) == 1, "Expected only one child on a section header: {}".format(dicts)
-        section_name = dicts[0]["key"]
-        return {"section": section_name}
-
-    def visit_section(self, node, visited_children):
-        """visited_children is a list including one {section: name} dict
-        and 1 or more other dicts representing assignments."""
-        dicts = flatten(visited_children)
-        section = {'assignments': []}
-        for d in dicts:
-            if 'section' in d:
-                section['name'] = d['section']
-            else:
-                section['assignments'].append(d)
-        return section
-
-    def visit_key(self, node, visited_children):
-        return {'key': node.text}
-
-    def visit_value(self, node, visited_children):
-        return {'value': node.text}
-
-    # If we're not interested in this node, just bubble it up.
-    def generic_visit(self, node, visited_children):
-        return visited_children
-
-
-def parse(config_string):
-    try:
-        parsed_string = grammar.parse(config_string)
-    except parsimonious.exceptions.IncompleteParseError as exc:
-        exc_type, exc_value, exc_traceback = sys.exc_info()
-        raise_(SyntaxError, "Invalid config file syntax: {}".format(exc_value), exc_traceback)
+def parse_peg(config_string):
+    """Parses config_string with the PEG engine (see peg.py). Returns the
+    list of assignment and section dicts built by ConfigTamerNodeVisitor."""
+    from . import peg
+    return peg.parse(config_string)
 
-    visitor = ConfigTamerNodeVisitor()
-    parsed_config = visitor.visit(parsed_string)
 
-    config = process_config(parsed_config)
-    return config
+def parse_parallel(config_string):
+    """Parses config_string with the "fast" engine, in pieces, across a pool
+    of processes (see batch.py)."""
+    # batch imports this module
+    from . import batch
+    return batch.parse_parallel(config_string)
 
 
-def process_config(config):
-    """Processes a parsed config tree. Returns a Config object."""
-    interpolated = process_assignments(config)
-    for section in [d for d in config if 'name' in d]:
-        setattr(interpolated, section['name'], process_assignments(section['assignments']))
-    return interpolated
+# "peg" is the reference engine. "fast" (the default) accepts the same
+# language and gives the same results, but doesn't recurse once per line,
+# so it copes with configs of any size. It's built on the same parse events
+# iterparse() yields. "parallel" is "fast", spread over every CPU.
+engines = {
+    'peg': parse_peg,
+    'fast': parse_lines,
+    'parallel': parse_parallel,
+}
 
 
-def process_assignments(config):
-    """Handles interpolation of assignment values. Returns a Config object."""
-    items = {}
-    to_interpolate = {}
+def parse(config_string, engine='fast', lazy=False, flatten_defaults=False, stats=None,
+          directory=None, sections=None, incremental=False):
+    """Parses config_string. Returns a Config object.
 
-    import re
-    re_interpolation = re.compile(r'\{([^}]+)\}')
+    engine is the name of one of the parser engines. If lazy is true,
+    values are only interpolated when they're first read (see LazyConfig).
 
-    for item in config:
-        if 'name' in item:
-            # This is a section. Nothing to interpolate
-            continue
-        assignment = item
-        key = assignment["key"]
-        value = assignment["value"]
+    Sections that default to other sections have the keys those have, too.
+    Inherited values that don't reference anything are shared, not copied.
+    With lazy=True, they're looked up along the chain of defaults the first
+    time they're read, and then kept; otherwise, they're resolved up front,
+    like everything else. flatten_defaults, which used to ask for that, is
+    still accepted, and makes no difference.
 
-        if re_interpolation.search(value):
-            to_interpolate[key] = value
-            continue
+    If stats is a ParseStats object, it's filled in with how long each phase
+    of parsing took, and how much there was to parse.
 
-        items[key] = value
+    Included fragments (see include.py) are looked for relative to
+    directory, the current directory by default.
 
-    for key, value in to_interpolate.items():
-        value = re_interpolation.sub(lambda m: items[m.group(1)], value)
-        items[key] = value
+    If sections is a list of top-level section names, only those sections
+    are returned, and the rest of the text is mostly skipped: only the top
+    level and the sections they need (that they reference or default to)
+    are parsed and interpolated. Raises KeyError if one isn't defined.
 
-    config = Config()
-    for key, value in items.items():
-        config.__add_key_value__(key, value)
+    If incremental is true, a digest of each top-level section's text is
+    kept (as long as the Config is), so that reparse() can reuse the
+    sections an edit of the text doesn't affect. That costs a little time.
+    """
+    try:
+        parse_engine = engines[engine]
+    except KeyError:
+        raise ValueError("Unknown parser engine: {}".format(engine))
+    if sections is not None:
+        if stats is not None:
+            raise ValueError("Can't gather stats when parsing only some sections")
+        if incremental:
+            raise ValueError("Can't reparse configs parsed only in part")
+        # incremental imports this module
+        from .incremental import parse_sections
+        return parse_sections(config_string, sections, engine, lazy, directory)
+    if stats is not None:
+        config = _parse_with_stats(config_string, engine, lazy, stats, directory)
+    else:
+        parsed_config = parse_engine(config_string)
+        config = process_config(parsed_config, lazy=lazy, include=Includer(directory))
+    if incremental:
+        # incremental imports this module
+        from .incremental import remember_digests
+        remember_digests(config, config_string)
+    return config
 
+def _parse_with_stats(config_string, engine, lazy, stats, directory):
+    """parse(), phase by phase, filling stats in. Kept apart so that
+    parse() itself has no instrumentation at all."""
+    stats.lines = sum(1 for _ in split_lines(config_string))
+    if engine == 'peg':
+        # Imported first, so that the first parse's 'grammar' phase doesn't
+        # include building the grammar
+        from . import peg
+        with stats.phase('grammar'):
+            tree = peg.parse_tree(config_string)
+        stats.nodes = count_nodes(tree)
+        visitor = peg.TimedNodeVisitor()
+        with stats.phase('visit'):
+            parsed_config = visitor.visit(tree)
+        stats.split_phase('visit', 'flatten', visitor.flatten_seconds)
+    else:
+        with stats.phase('parse'):
+            parsed_config = engines[engine](config_string)
+    count_items(parsed_config, stats)
+    if engine != 'peg':
+        # A start and an end event for each section
+        stats.nodes = stats.assignments + 2 * stats.sections
+
+    with stats.phase('scopes'):
+        scope = build_scopes(parsed_config, Includer(directory))
+    with stats.phase('interpolate'):
+        if lazy:
+            config = LazyConfig(scope)
+        else:
+            config = build_config(scope)
+    stats.interpolations = count_interpolations(scope)
     return config
+
+
+def process_config(config, lazy=False, include=None):
+    """Processes a parsed config tree. Returns a Config object,
+    or a LazyConfig if lazy is true.
+
+    Include directives are resolved by include, an include.Includer (by
+    default, one that looks for fragments in the current directory).
+    """
+    if include is None:
+        include = Includer()
+    scope = build_scopes(config, include)
+    if lazy:
+        return LazyConfig(scope)
+    return build_config(scope)
+
+
+def process_assignments(config):
+    """Handles interpolation of assignment values. Returns a Config object.
+    Sections are ignored."""
+    return build_config(build_scopes([item for item in config if 'name' not in item]))
+
+
+def build_config(scope):
+    """Interpolates every value in a Scope tree, inherited ones included.
+    Returns a Config object, which doesn't keep the Scopes alive."""
+    items = [(key, scope.resolve(key)) for key in scope.keys()]
+    items.extend((name, build_config(section)) for name, section in scope.sections.items())
+    return Config(items)
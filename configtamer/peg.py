@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+"""The PEG parser engine ("peg"): a parsimonious grammar, and a visitor that
+turns its parse trees into lists of assignment and section dicts.
+
+It's the reference engine, but not the default one: this module (and
+parsimonious, and building the grammar) is only imported when it's first
+used, so that importing configtamer stays cheap.
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import re
+import sys
+import timeit
+from bisect import bisect_right
+
+import parsimonious
+from parsimonious.grammar import Grammar
+from parsimonious.nodes import NodeVisitor
+
+from .compat import raise_
+from .fastparser import split_lines
+from .parser import flatten
+
+
+_newline_re = re.compile(r'\r\n|\n|\r')
+
+grammar = Grammar(
+    r"""
+    config               = empty_lines? top_level? sections? (newline trailing_empty_lines)?
+
+    top_level            = (top_level_line newline lines) / top_level_line
+    lines                = (line newline lines) / line
+    line                 = top_level_line / empty_line
+    top_level_line       = include / assignment
+    include              = "@include" whitespace_inline+ value whitespace_inline*
+
+    sections             = (section sections) / section
+    section              = section_header newline empty_lines? indented_assignments
+    section_header       = section_name whitespace_inline* section_default? assignment_colon whitespace_inline*
+    section_name         = key
+    section_default      = "[" whitespace_inline* ~"default"i whitespace_inline* assignment_colon whitespace_inline* key whitespace_inline* "]" whitespace_inline*
+    indented_assignments = (indented_item newline indented_lines) / indented_item
+    indented_lines       = (indented_line newline indented_lines) / indented_line
+    indented_line        = indented_item / empty_line
+    indented_item        = indented_assignment / subsection_header
+    # A header within a section starts a subsection if the next line that
+    # isn't empty is indented more deeply. How far subsections go is down
+    # to indentation too: ConfigTamerNodeVisitor nests them.
+    subsection_header    = subsection_indentation section_header
+    subsection_indentation = ~"( +)(?=[a-z0-9][a-z0-9_]*[ \t]*(?:\\[[ \t]*default[ \t]*:[ \t]*[a-z0-9][a-z0-9_]*[ \t]*\\][ \t]*)?:[ \t]*(?:\r\n|\n|\r)(?:[ \t]*(?:\r\n|\n|\r))*\\1 +[^\\s])"i
+    indented_assignment  = continued_indented_assignment / (" "+ key whitespace_inline* assignment_op whitespace_inline* value whitespace_inline*)
+
+    assignment           = key whitespace_inline* assignment_op whitespace_inline* (continued_value / value) whitespace_inline*
+    key                  = ~"[a-z0-9][a-z0-9_]*"i
+    # This seems a little too permissive, but we'll get to that.
+    value                = ~"[^\s]([^\r\n]*[^\s])?"
+    # Values that end with a comma go on over the lines after them that are
+    # indented more deeply than their key. For indented assignments, that
+    # takes a back reference to their indentation, hence a single regex.
+    # (Backslashes are doubled where string escapes would swallow them.)
+    continued_value      = ~"(?:(?=[^\\s])[^\r\n]*,[ \t]*(?:\r\n|\n|\r)[ \t]+)+[^\\s]([^\r\n]*[^\\s])?"
+    continued_indented_assignment = ~"( +)([a-z0-9][a-z0-9_]*)[ \t]*[:=][ \t]*((?:(?=[^\\s])[^\r\n]*,[ \t]*(?:\r\n|\n|\r)\\1[ \t]+)+[^\\s](?:[^\r\n]*[^\\s])?)[ \t]*"i
+    assignment_colon     = ":"
+    assignment_equals    = "="
+    assignment_op        = assignment_colon / assignment_equals
+    empty_lines          = (empty_line newline empty_lines) / (empty_line newline)
+    trailing_empty_lines = (empty_line newline empty_lines) / empty_line
+    empty_line           = whitespace_inline*
+    whitespace_inline    = " " / "\t"
+    newline              = "\r\n" / "\n" / "\r"
+    """)
+
+class ConfigTamerNodeVisitor(NodeVisitor):
+    line_offsets = None
+    # A method, so that it can be timed (see parse(..., stats=...))
+    flatten = staticmethod(flatten)
+
+    def line_number(self, node):
+        """Returns the (1-based) line number where node starts."""
+        if self.line_offsets is None:
+            self.line_offsets = [offset for offset, _, _ in split_lines(node.full_text)]
+        return bisect_right(self.line_offsets, node.start)
+
+    def visit_config(self, node, visited_children):
+        # each of visited_children is a >=0 list of
+        # {key: "key", value: "value"} or
+        # {'name': "section_name", "assignments": [...]}
+        # dicts representing assignments and sections (or None, representing empty matches)
+        assignments = self.flatten(visited_children)
+        return assignments
+
+    def visit_line(self, node, visited_children):
+        # visited_children is a list with either a single element,
+        # a dict {key: "key", value: "value"} representing assignments,
+        # or an empty list representing an empty line.
+        assert len(visited_children) == 1, "Expected only one child in a line: {}".format(visited_children)
+        return visited_children
+
+    def visit_assignment(self, node, visited_children):
+        # After flattening, visited_children are one dict with "key"
+        # and one with "value"
+        items = [pair for d in self.flatten(visited_children)
+                  for pair in d.items()]
+        merged = dict(items)
+        merged['line'] = self.line_number(node)
+        return merged
+
+    def visit_indented_assignment(self, node, visited_children):
+        assignment = self.visit_assignment(node, visited_children)
+        assignment['indentation'] = len(node.text) - len(node.text.lstrip(" "))
+        return assignment
+
+    def visit_continued_indented_assignment(self, node, visited_children):
+        return {'key': node.match.group(2), 'value': join_lines(node.match.group(3))}
+
+    def visit_section_header(self, node, visited_children):
+        # visited_children, flattened, should contain a {key: section_name}
+        # dict representing the section name, and maybe a {default: name}
+        # dict naming the section it defaults to
+        dicts = self.flatten(visited_children)
+        assert 1 <= len(dicts) <= 2, "Expected one or two children on a section header: {}".format(dicts)
+        header = {"section": dicts[0]["key"], "line": self.line_number(node)}
+        if len(dicts) == 2:
+            header["default"] = dicts[1]["default"]
+        return header
+
+    def visit_subsection_header(self, node, visited_children):
+        header = dict(item for d in self.flatten(visited_children) for item in d.items())
+        header['indentation'] = len(node.text) - len(node.text.lstrip(" "))
+        return header
+
+    def visit_section_default(self, node, visited_children):
+        # visited_children, flattened, is a single {key: section_name} dict
+        dicts = self.flatten(visited_children)
+        return {"default": dicts[0]["key"]}
+
+    def visit_section(self, node, visited_children):
+        """visited_children is a list including one {section: name} dict
+        and 1 or more other dicts representing assignments and subsection
+        headers, which come with their indentation. Each subsection holds
+        what comes after its header, up to the first line that isn't
+        indented more deeply than the header."""
+        dicts = self.flatten(visited_children)
+        section = {'assignments': []}
+        # The sections the next assignment may be in: (indentation, section)
+        enclosing = [(0, section)]
+        for d in dicts:
+            if 'indentation' not in d:
+                section['name'] = d['section']
+                section['line'] = d['line']
+                if 'default' in d:
+                    section['default'] = d['default']
+                continue
+            indentation = d.pop('indentation')
+            while enclosing[-1][0] >= indentation:
+                enclosing.pop()
+            assignments = enclosing[-1][1]['assignments']
+            if 'section' in d:
+                subsection = {'name': d['section'], 'assignments': [], 'line': d['line']}
+                if 'default' in d:
+                    subsection['default'] = d['default']
+                assignments.append(subsection)
+                enclosing.append((indentation, subsection))
+            else:
+                assignments.append(d)
+        return section
+
+    def visit_include(self, node, visited_children):
+        # visited_children, flattened, is a single {value: path} dict
+        dicts = self.flatten(visited_children)
+        return {'include': dicts[0]['value'], 'line': self.line_number(node)}
+
+    def visit_key(self, node, visited_children):
+        return {'key': node.text}
+
+    def visit_value(self, node, visited_children):
+        return {'value': node.text}
+
+    def visit_continued_value(self, node, visited_children):
+        return {'value': join_lines(node.text)}
+
+    # If we're not interested in this node, just bubble it up.
+    def generic_visit(self, node, visited_children):
+        return visited_children
+
+
+def join_lines(value):
+    """Joins the lines of a continued value with single spaces."""
+    return " ".join(line.strip(" \t") for line in _newline_re.split(value))
+
+
+def parse(config_string):
+    """Parses config_string with the PEG grammar. Returns the list of
+    assignment and section dicts built by ConfigTamerNodeVisitor."""
+    visitor = ConfigTamerNodeVisitor()
+    return visitor.visit(parse_tree(config_string))
+
+
+def parse_tree(config_string):
+    """Returns the parsimonious parse tree of config_string. Raises SyntaxError."""
+    try:
+        return grammar.parse(config_string)
+    except parsimonious.exceptions.IncompleteParseError as exc:
+        exc_type, exc_value, exc_traceback = sys.exc_info()
+        raise_(SyntaxError, "Invalid config file syntax: {}".format(exc_value), exc_traceback)
+
+
+class TimedNodeVisitor(ConfigTamerNodeVisitor):
+    """A ConfigTamerNodeVisitor that keeps track of the time spent in flatten()."""
+    flatten_seconds = 0
+
+    def flatten(self, items):
+        start = timeit.default_timer()
+        try:
+            return flatten(items)
+        finally:
+            self.flatten_seconds += timeit.default_timer() - start
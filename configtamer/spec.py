@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+"""Specs: annotated example configs, which describe the type of each value,
+and which keys are optional (and their defaults).
+
+    production:
+        debug: True [optional, bool, default=True]
+        code_dir: /path/to/code [path]
+        instances = 2 [optional, int, default=1]
+        dbservers = db1, db2 [list]
+
+compile_spec() turns a spec into a Spec, which holds a converter for each
+key, and its default already converted. Applying it to a config is then a
+single pass over the config's keys.
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import os
+import re
+
+from .config import Config
+from .fastparser import parse_lines
+from .incremental import header_re
+from .parser import parse
+from .values import to_bool, to_list
+
+
+# A value's annotations, at the end of the value
+_annotations_re = re.compile(r'\[([^\[\]]*)\]\Z')
+
+
+class SpecError(Exception):
+    """A spec is invalid."""
+
+
+class ValidationError(ValueError):
+    """A config doesn't match its spec."""
+    def __init__(self, message, path):
+        ValueError.__init__(self, message)
+        self.path = path
+
+    def __reduce__(self):
+        return (self.__class__, (str(self), self.path))
+
+
+def to_path(value):
+    """Normalizes a path (e.g. removes duplicated slashes)."""
+    return os.path.normpath(value)
+
+
+# Type annotations: {name: converter}. Converters take a string, and raise
+# ValueError if it isn't valid.
+types = {
+    'str': lambda value: value,
+    'int': int,
+    'float': float,
+    'bool': to_bool,
+    'list': to_list,
+    'path': to_path,
+}
+
+
+class KeySpec(object):
+    """What a spec says about a key."""
+    __slots__ = ('key', 'type', 'convert', 'optional', 'default')
+
+    _no_default = object()
+
+    def __init__(self, key, annotations=None):
+        """annotations is the text between the brackets, e.g.
+        "optional, int, default=1". Raises SpecError."""
+        self.key = key
+        self.type = 'str'
+        self.optional = False
+        self.default = self._no_default
+        if annotations is None:
+            annotations = ""
+        annotations, separator, default = annotations.partition("default=")
+        names = [name.strip().lower() for name in annotations.split(",")]
+        for name in names:
+            if name == 'optional':
+                self.optional = True
+            elif name in types:
+                self.type = name
+            elif name:
+                raise SpecError("Unknown annotation for '{}': {}".format(key, name))
+        self.convert = types[self.type]
+        if separator:
+            # Everything after "default=" is the default, commas included
+            self.optional = True
+            try:
+                self.default = self.convert(default.strip())
+            except ValueError as exc:
+                raise SpecError("Invalid default for '{}': {}".format(key, exc))
+
+    @property
+    def has_default(self):
+        return self.default is not self._no_default
+
+
+class SectionSpec(object):
+    """What a spec says about a section (or the top level): keys is
+    {key: KeySpec}, and sections is {name: SectionSpec}."""
+
+    def __init__(self):
+        self.keys = {}
+        self.sections = {}
+        # Precomputed by finish()
+        self.required = ()
+        self.defaults = ()
+
+    def finish(self):
+        self.required = tuple(key for key, key_spec in self.keys.items() if not key_spec.optional)
+        self.defaults = tuple((key, key_spec.default) for key, key_spec in self.keys.items()
+                              if key_spec.has_default)
+        for section in self.sections.values():
+            section.finish()
+        return self
+
+    def apply(self, config, path="", defaults=None):
+        """Checks and converts config. Returns a new Config. Sections that
+        aren't in the spec but default to one that is (according to
+        defaults, {section: the section it defaults to}) follow its spec."""
+        items = []
+        keys = self.keys
+        sections = self.sections
+        for key, value in config.items():
+            key_spec = keys.get(key)
+            if key_spec is not None:
+                if isinstance(value, Config):
+                    raise ValidationError("'{}{}' should be a value, not a section".format(path, key),
+                                          path + key)
+                try:
+                    value = key_spec.convert(value)
+                except ValueError as exc:
+                    raise ValidationError("Invalid value for '{}{}': {}".format(path, key, exc),
+                                          path + key)
+            else:
+                section = sections.get(key)
+                if section is None and defaults:
+                    section = self._inherited(key, defaults)
+                if section is not None:
+                    if not isinstance(value, Config):
+                        raise ValidationError("'{}{}' should be a section".format(path, key), path + key)
+                    value = section.apply(value, path + key + ".")
+            items.append((key, value))
+
+        for key in self.required:
+            if key not in config:
+                raise ValidationError("Missing required key '{}{}'".format(path, key), path + key)
+        items.extend((key, default) for key, default in self.defaults if key not in config)
+        for name, section in sections.items():
+            if name not in config:
+                items.append((name, section.apply(Config(), path + name + ".")))
+        return Config(items)
+
+    def _inherited(self, name, defaults):
+        seen = set()
+        while name in defaults and name not in seen:
+            seen.add(name)
+            name = defaults[name]
+            if name in self.sections:
+                return self.sections[name]
+        return None
+
+
+class Spec(object):
+    """A compiled spec: see compile_spec()."""
+
+    def __init__(self, top_level):
+        self.top_level = top_level
+
+    def apply(self, config):
+        """Checks config against the spec, and converts its values.
+        Returns a new Config. Raises ValidationError."""
+        return self.top_level.apply(config)
+
+    def parse(self, config_string, **parse_options):
+        """Parses config_string (see parse()) and applies the spec to it.
+        Unlike apply(), sections that default to a section in the spec
+        ("section [default: other]:") follow its spec too."""
+        config = parse(config_string, **parse_options)
+        defaults = {}
+        for match in header_re.finditer(config_string):
+            name, default = match.groups()
+            if default is not None:
+                defaults[name.lower()] = default.lower()
+        return self.top_level.apply(config, defaults=defaults)
+
+
+def compile_spec(spec_string):
+    """Compiles a spec (see above). Returns a Spec.
+
+    Each value in the spec is an example, followed by its annotations in
+    brackets: a type (str, the default, int, float, bool, list or path),
+    "optional" and "default=..." (last, and implying optional). Keys
+    without annotations are required strings. Raises SpecError.
+    """
+    try:
+        parsed = parse_lines(spec_string)
+    except SyntaxError as exc:
+        raise SpecError("Invalid spec: {}".format(exc))
+    return Spec(_section_spec(parsed).finish())
+
+
+def _section_spec(items):
+    section = SectionSpec()
+    for item in items:
+        if 'name' in item:
+            section.sections[item['name'].lower()] = _section_spec(item['assignments'])
+            continue
+        if 'include' in item:
+            raise SpecError("Specs can't include other files (line {})".format(item['line']))
+        key = item['key'].lower()
+        match = _annotations_re.search(item['value'])
+        section.keys[key] = KeySpec(key, match.group(1) if match else None)
+    return section
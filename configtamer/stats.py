@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+"""Instrumentation for parse(): where the time (and memory) went."""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import timeit
+from collections import namedtuple
+from contextlib import contextmanager
+
+# seconds is wall time. peak_memory is the most memory allocated (in bytes)
+# during the phase, over what was allocated when it started, or None if
+# memory wasn't traced.
+Phase = namedtuple('Phase', ['name', 'seconds', 'peak_memory'])
+
+
+class ParseStats(object):
+    """Statistics about a single call to parse(), which fills them in when
+    passed as parse(..., stats=ParseStats()):
+
+    phases:         a list of Phases, in order. The "peg" engine goes through
+                    "grammar" (parsimonious), "visit" (ConfigTamerNodeVisitor)
+                    and "flatten" (the part of the visit spent in flatten()),
+                    other engines through "parse". Then come "scopes"
+                    (build_scopes()) and "interpolate" (build_config(), or
+                    creating the LazyConfig if lazy=True).
+    lines:          the number of lines parsed
+    nodes:          the number of parse tree nodes for the "peg" engine, or
+                    of parse events for the "fast" one
+    sections, assignments: how many there were (at all levels)
+    interpolations: the number of values with {references} that were
+                    interpolated (none yet, if lazy=True)
+
+    If memory is true, allocations are traced with tracemalloc, which
+    makes everything several times slower (timings included), and
+    phases have their peak_memory. Not available on Python 2.
+    """
+
+    def __init__(self, memory=False):
+        # tracemalloc is only imported when it's needed
+        self._tracemalloc = _import_tracemalloc() if memory else None
+        self.memory = self._tracemalloc is not None
+        self.phases = []
+        self.lines = self.nodes = self.sections = self.assignments = self.interpolations = 0
+
+    @property
+    def seconds(self):
+        """The total time spent in all phases."""
+        return sum(phase.seconds for phase in self.phases)
+
+    @property
+    def peak_memory(self):
+        peaks = [phase.peak_memory for phase in self.phases if phase.peak_memory is not None]
+        return max(peaks) if peaks else None
+
+    @contextmanager
+    def phase(self, name):
+        """Times (and if memory is true, traces) the code in a with block
+        as one phase."""
+        tracemalloc = self._tracemalloc
+        tracing = self.memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        if self.memory:
+            _reset_peak(tracemalloc)
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = timeit.default_timer()
+        try:
+            yield
+        finally:
+            seconds = timeit.default_timer() - start
+            peak_memory = None
+            if self.memory:
+                peak_memory = max(tracemalloc.get_traced_memory()[1] - baseline, 0)
+            if tracing:
+                tracemalloc.stop()
+            self.phases.append(Phase(name, seconds, peak_memory))
+
+    def split_phase(self, name, part, seconds):
+        """Splits seconds off the last phase (which is name), as a phase
+        of its own called part."""
+        last = self.phases.pop()
+        assert last.name == name
+        self.phases.append(last._replace(seconds=last.seconds - seconds))
+        self.phases.append(Phase(part, seconds, None))
+
+    def __str__(self):
+        lines = ["{:<12} {:>10} {:>12}".format("phase", "ms", "peak KiB")]
+        for name, seconds, peak_memory in self.phases + [Phase("total", self.seconds, self.peak_memory)]:
+            lines.append("{:<12} {:>10.3f} {:>12}".format(
+                name, seconds * 1000, "{:.1f}".format(peak_memory / 1024) if peak_memory is not None else "-"))
+        lines.append("{} lines, {} nodes, {} sections, {} assignments, {} interpolations".format(
+            self.lines, self.nodes, self.sections, self.assignments, self.interpolations))
+        return "\n".join(lines)
+
+
+def _import_tracemalloc():
+    try:
+        import tracemalloc
+    except ImportError:
+        # Python 2
+        return None
+    return tracemalloc
+
+
+def _reset_peak(tracemalloc):
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    else:
+        # Before Python 3.9, the peak can only be reset along with the traces
+        tracemalloc.clear_traces()
+
+
+def count_nodes(tree):
+    """Returns the number of nodes in a parsimonious parse tree."""
+    count = 0
+    pending = [tree]
+    while pending:
+        node = pending.pop()
+        count += 1
+        pending.extend(node.children)
+    return count
+
+
+def count_items(parsed_config, stats):
+    """Counts the sections and assignments in a list of assignment and
+    section dicts, into stats."""
+    pending = [parsed_config]
+    while pending:
+        for item in pending.pop():
+            if 'name' in item:
+                stats.sections += 1
+                pending.append(item['assignments'])
+            elif 'key' in item:
+                stats.assignments += 1
+
+
+def count_interpolations(scope):
+    """Returns the number of values with references that were interpolated
+    in a Scope tree."""
+    count = 0
+    pending = [scope]
+    while pending:
+        scope = pending.pop()
+        count += sum(1 for key in scope.resolved if '{' in scope.raw(key)[0])
+        pending.extend(scope.sections.values())
+    return count
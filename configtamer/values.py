@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""Config values: strings, which can also be read as other types.
+
+    >>> config.servers.webservers
+    'web1, web2, web42,'
+    >>> config.servers.webservers.as_list()
+    ['web1', 'web2', 'web42']
+
+Each conversion is done once per value, and then remembered, so reading a
+value as a list (or an int, ...) on every request costs a dict lookup.
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from .compat import text_type
+
+
+def to_bool(value):
+    lowered = value.lower()
+    if lowered in ('true', 'yes', 'on', '1'):
+        return True
+    if lowered in ('false', 'no', 'off', '0'):
+        return False
+    raise ValueError("Not a boolean: '{}'".format(value))
+
+
+def to_list(value):
+    """Splits a comma-separated list. Whitespace around items, and empty
+    items (e.g. after a trailing comma) are dropped."""
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+class Value(text_type):
+    """An interpolated config value. The as_*() methods raise ValueError if
+    it isn't valid as that type (and try again the next time)."""
+
+    # Strings can't have slots: conversions are kept in the instance dict,
+    # which is only created by the first one.
+
+    def _converted(self, name, convert):
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            converted = self.__dict__[name] = convert(self)
+            return converted
+
+    def as_list(self):
+        """The comma-separated items of the value (see to_list()).
+        Returns a new list each time, so it can be changed freely."""
+        return list(self._converted('list', _to_tuple))
+
+    def as_int(self):
+        return self._converted('int', int)
+
+    def as_float(self):
+        return self._converted('float', float)
+
+    def as_bool(self):
+        """True for true, yes, on and 1, False for false, no, off and 0
+        (whatever their case)."""
+        return self._converted('bool', to_bool)
+
+
+def _to_tuple(value):
+    return tuple(to_list(value))
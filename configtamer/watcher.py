@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+"""Watching config files for changes, and reloading them."""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import os
+import time
+from collections import namedtuple
+
+from .config import Config
+from .cache import RACY_INTERVAL, content_hash, _fingerprint
+from .incremental import reparse
+from .loader import read
+from .parser import parse
+
+
+DEFAULT_INTERVAL = 1.0
+DEFAULT_DEBOUNCE = 0.1
+
+# Kinds of Change. key is the dotted path to the key (section.key).
+ADDED = 'added'
+REMOVED = 'removed'
+CHANGED = 'changed'
+
+Change = namedtuple('Change', ['kind', 'key'])
+
+
+def watch(path, callback, interval=DEFAULT_INTERVAL, debounce=DEFAULT_DEBOUNCE,
+          on_error=None, flatten_defaults=False):
+    """Watches the config file at path, and calls callback(config, changes)
+    each time it changes. config is the new Config, and changes is a list of
+    Change tuples, for each key that was added, removed or changed.
+
+    A background thread checks the file's size, mtime and inode every
+    interval seconds. When they change, it waits until they've stayed the
+    same for debounce seconds, so that a burst of writes only causes one
+    reload. The file is then re-parsed (incrementally, with reparse()), but
+    only if its contents really changed, and callback is only called if the
+    config did. Only path itself is watched, not the fragments it includes.
+
+    The file is parsed once right away: errors are raised as usual. Later
+    errors (including those raised by callback) are passed to on_error,
+    if given, or logged. Either way, the last good config is kept.
+
+    Returns the Watcher, already started. Call its stop() method to stop
+    watching.
+    """
+    return Watcher(path, callback, interval, debounce, on_error, flatten_defaults).start()
+
+
+class Watcher(object):
+    """Watches a config file for changes: see watch(). config is the last
+    config successfully parsed from it.
+
+    Nothing happens in the background until start() is called, but check()
+    can be called at any time.
+    """
+
+    def __init__(self, path, callback, interval=DEFAULT_INTERVAL, debounce=DEFAULT_DEBOUNCE,
+                 on_error=None, flatten_defaults=False):
+        self.path = path
+        self.callback = callback
+        self.interval = interval
+        self.debounce = debounce
+        self.on_error = on_error
+        self.flatten_defaults = flatten_defaults
+        # Imported here, as logging (in _run()) is: only programs that watch
+        # files need them
+        import threading
+        self._stopped = threading.Event()
+        self._thread = None
+
+        stat = os.stat(path)
+        data = read(path)
+        self._directory = os.path.dirname(os.path.abspath(path))
+        self.config = parse(data.decode('utf-8'), flatten_defaults=flatten_defaults,
+                            directory=self._directory, incremental=True)
+        self._remember(stat, data)
+
+    def _remember(self, stat, data):
+        self._fingerprint = _fingerprint(stat)
+        self._digest = content_hash(data)
+        # A file modified this recently may be modified again without its
+        # fingerprint changing: keep reading it until it isn't anymore.
+        self._racy = time.time() - stat.st_mtime < RACY_INTERVAL
+
+    def start(self):
+        import threading
+        self._thread = threading.Thread(target=self._run, name="configtamer watcher: {}".format(self.path))
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stops watching, and waits (at most timeout seconds) for the
+        background thread to finish."""
+        import threading
+        self._stopped.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.check()
+            except Exception as exc:
+                if self.on_error is not None:
+                    self.on_error(exc)
+                else:
+                    import logging
+                    logging.getLogger(__name__).exception("Error reloading %s", self.path)
+
+    def check(self):
+        """Checks whether the file has changed, and if so, reloads it and
+        calls the callback. Returns the list of changes (empty if there were
+        none). Raises parse errors, and whatever the callback raises."""
+        stat = _stat(self.path)
+        if stat is not None and _fingerprint(stat) == self._fingerprint and not self._racy:
+            return []
+        # Wait for the file to settle down
+        while self.debounce:
+            if self._stopped.wait(self.debounce):
+                return []
+            settled = _stat(self.path)
+            if _fingerprint(settled) == _fingerprint(stat):
+                break
+            stat = settled
+        if stat is None:
+            # Removed, or about to be replaced: keep the last config
+            return []
+
+        try:
+            data = read(self.path)
+        except (IOError, OSError):
+            return []
+        digest = self._digest
+        # Remembered before parsing, so that an invalid file is only
+        # reported once, until it changes again
+        self._remember(stat, data)
+        if self._digest == digest:
+            return []
+
+        config = reparse(self.config, data.decode('utf-8'), flatten_defaults=self.flatten_defaults,
+                         directory=self._directory)
+        changes = diff(self.config, config)
+        self.config = config
+        if changes:
+            self.callback(config, changes)
+        return changes
+
+
+def diff(old, new, prefix=""):
+    """Returns a list of Changes from Config old to Config new. Sections
+    that are the same object in both are skipped without looking inside."""
+    changes = []
+    for key in new:
+        path = prefix + key
+        if key not in old:
+            changes.append(Change(ADDED, path))
+            continue
+        old_value, new_value = old[key], new[key]
+        if old_value is new_value:
+            continue
+        if isinstance(old_value, Config) and isinstance(new_value, Config):
+            changes.extend(diff(old_value, new_value, path + "."))
+        elif old_value != new_value:
+            changes.append(Change(CHANGED, path))
+    changes.extend(Change(REMOVED, prefix + key) for key in old if key not in new)
+    return changes
+
+
+def _stat(path):
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+"""Writing config files.
+
+Writer emits a config one assignment at a time, buffering only a few
+lines, so configs of any size can be generated in constant memory:
+
+    with Writer(output) as writer:
+        writer.assign('root', '/srv')
+        for host in hosts:
+            writer.section(host.name)
+            writer.assign('path', '{root}/' + host.name)
+
+dump() writes a whole Config, already interpolated. Either way, parsing
+the output gives back what was written.
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import io
+import re
+
+from .compat import string_types
+from .config import Config
+from .interpolation import reference_re
+
+
+# As in the grammar
+_key_re = re.compile(r'[a-z0-9][a-z0-9_]*\Z', re.I)
+_value_re = re.compile(r'[^\s](?:[^\r\n]*[^\s])?\Z')
+
+INDENT = "    "
+
+# Lines written to the file at once
+BUFFER_LINES = 1024
+
+
+class Writer(object):
+    """Writes a config to fileobj (a file object in text mode), as it's
+    given: top-level assignments first, then sections, each followed by
+    its assignments and subsections. Values are written as they are, so
+    {references} in them are interpolated when the config is parsed.
+
+    Invalid keys and values (which couldn't be parsed back, such as empty
+    values or values that span several lines) and empty sections raise
+    ValueError.
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self._lines = []
+        self._started = False
+        # The sections being written, outermost first, and whether the
+        # innermost one has anything in it yet
+        self._sections = []
+        self._empty = False
+
+    def assign(self, key, value):
+        if not _key_re.match(key):
+            raise ValueError("Invalid key: '{}'".format(key))
+        if not isinstance(value, string_types):
+            raise TypeError("Values must be strings, not {}: '{}'".format(type(value).__name__, key))
+        if not _value_re.match(value):
+            raise ValueError("Value for '{}' can't be written: {!r}".format(key, value))
+        self._lines.append("{}{}: {}\n".format(INDENT * len(self._sections), key, value))
+        self._empty = False
+        self._started = True
+        if len(self._lines) >= BUFFER_LINES:
+            self.flush()
+
+    def section(self, name, default=None, depth=1):
+        """Starts a section, which defaults to section default, if given.
+        Its assignments come next (there's no going back to the enclosing
+        section). depth is 1 for top-level sections, 2 for their subsections,
+        and so on: a section can be as deep as the current one, or one
+        deeper (as its subsection)."""
+        if not 1 <= depth <= len(self._sections) + 1:
+            raise ValueError("Section '{}' can't be at depth {} after depth {}".format(
+                name, depth, len(self._sections)))
+        if depth <= len(self._sections):
+            self._check_section()
+        for section_name in (name, default):
+            if section_name is not None and not _key_re.match(section_name):
+                raise ValueError("Invalid section name: '{}'".format(section_name))
+        # Subsections straight after their section's header aren't set apart
+        separator = "\n" if self._started and not self._empty else ""
+        indent = INDENT * (depth - 1)
+        if default is None:
+            self._lines.append("{}{}{}:\n".format(separator, indent, name))
+        else:
+            self._lines.append("{}{}{} [default: {}]:\n".format(separator, indent, name, default))
+        del self._sections[depth - 1:]
+        self._sections.append(name)
+        self._empty = True
+        self._started = True
+
+    def flush(self):
+        self.fileobj.write("".join(self._lines))
+        del self._lines[:]
+
+    def close(self):
+        """Checks that the last section isn't empty, and writes whatever is
+        left. Doesn't close fileobj."""
+        self._check_section()
+        self.flush()
+
+    def _check_section(self):
+        if self._sections and self._empty:
+            raise ValueError("Section '{}' is empty".format(".".join(self._sections)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+
+def dump(config, fileobj):
+    """Writes config, a Config as returned by parse(), to fileobj (a file
+    object in text mode). Values are written as they are, already
+    interpolated: ValueError is raised for values that would be interpolated
+    again when parsed (such as "{key}", in a Config that wasn't parsed), and
+    for the ones Writer can't write."""
+    with Writer(fileobj) as writer:
+        _write_section(writer, config, 0)
+
+
+def dumps(config):
+    """Returns config as a string (see dump())."""
+    output = io.StringIO()
+    dump(config, output)
+    return output.getvalue()
+
+
+def _write_section(writer, config, depth):
+    # Values first: they can't come after subsections
+    sections = []
+    for key in config:
+        value = config[key]
+        if isinstance(value, Config):
+            sections.append((key, value))
+        else:
+            writer.assign(key, _literal(key, value))
+    for name, section in sections:
+        writer.section(name, depth=depth + 1)
+        _write_section(writer, section, depth + 1)
+
+
+def _literal(key, value):
+    if isinstance(value, string_types) and reference_re.search(value):
+        raise ValueError("Value for '{}' would be interpolated again: '{}'".format(key, value))
+    return value
@@ -5,7 +5,9 @@ from __future__ import print_function
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import os
 import sys
+import time
 import traceback
 
 import unittest
@@ -16,15 +18,31 @@ class TestParser(unittest.TestCase):
     def try_parse(self, config_string, expected):
         """Parses config_string and checks it against the expected result.
         Expected is a dict-of-dicts.
+        Every parser engine should give the same result.
         """
-        parsed = configtamer.parse(config_string)
+        for engine in configtamer.parser.engines:
+            parsed = configtamer.parse(config_string, engine=engine)
+            self.validate_parsed_config(parsed, expected)
+
+        # Lazy configs hold the same values, once they're read
+        parsed = configtamer.parse(config_string, lazy=True)
+        assert parsed == expected, "Expected: {}.\nGot: {}".format(expected, parsed)
         self.validate_parsed_config(parsed, expected)
 
+    def assert_syntax_error(self, config_string):
+        """Every parser engine should reject config_string, with the same message."""
+        messages = set()
+        for engine in configtamer.parser.engines:
+            with self.assertRaises(SyntaxError) as context:
+                configtamer.parse(config_string, engine=engine)
+            messages.add(str(context.exception))
+        assert len(messages) == 1, "Engines disagree: {}".format(messages)
+
     def validate_parsed_config(self, parsed, expected):
         # All keys and attributes should match
         # TODO: do this for every level of nested sections
         assert set(parsed) == set(expected), "Expected: {}.\nGot: {}".format(set(expected), set(parsed))
-        assert parsed.__dict__ == expected, "Expected: {}.\nGot: {}".format(expected, parsed.__dict__)
+        assert dict(parsed) == expected, "Expected: {}.\nGot: {}".format(expected, dict(parsed))
 
         for key in expected:
             # Config values should be identically accessible as attributes or dict keys
@@ -104,7 +122,7 @@ customer_again: I'm sorry, I have a cold.
                         "customer_again": "I'm sorry, I have a cold."})
 
     def test_top_level_assignment_with_leading_whitespace_in_key(self):
-        self.assertRaises(SyntaxError, configtamer.parse, "    parrot: is no more")
+        self.assert_syntax_error("    parrot: is no more")
 
 
 class TestInterpolation(TestParser):
@@ -163,6 +181,155 @@ dead:   \t  pining for the fjords
                         "dead": "pining for the fjords"})
 
 
+class TestInterpolationEngine(TestParser):
+    def test_chained_interpolation(self):
+        self.try_parse("""
+exclamation: {complaint}!
+complaint: it's {state}
+state: dead
+        """,
+                       {"exclamation": "it's dead!",
+                        "complaint": "it's dead",
+                        "state": "dead"})
+
+    def test_interpolation_is_case_insensitive(self):
+        self.try_parse("""
+Parrot: Polly
+wakeup_call: {PARROT}, wake up!
+        """,
+                       {'parrot': 'Polly',
+                        'wakeup_call': 'Polly, wake up!'})
+
+    def test_deep_chain(self):
+        lines = ["key{}: {{key{}}}.".format(i, i + 1) for i in range(5000)]
+        lines.append("key5000: end")
+        parsed = configtamer.parse("\n".join(reversed(lines)), engine="fast")
+        assert parsed.key0 == "end" + "." * 5000
+        assert parsed.key4999 == "end."
+
+    def test_missing_key(self):
+        with self.assertRaises(configtamer.MissingKeyError) as context:
+            configtamer.parse("\nparrot: Polly\nwakeup_call: {parot}, wake up!")
+        assert context.exception.reference == "parot"
+        assert context.exception.path == "wakeup_call"
+        assert context.exception.line == 3
+        assert str(context.exception) == \
+            "Key 'parot' is not defined (referenced by 'wakeup_call' on line 3)"
+
+    def test_missing_key_is_a_key_error(self):
+        self.assertRaises(KeyError, configtamer.parse, "wakeup_call: {parrot}")
+
+    def test_circular_reference(self):
+        for engine in configtamer.parser.engines:
+            with self.assertRaises(configtamer.CircularReferenceError) as context:
+                configtamer.parse("a: {b}\nb: x{c}\nc: {a}\nd: {a}", engine=engine)
+            assert context.exception.cycle == [("a", 1), ("b", 2), ("c", 3)]
+            assert str(context.exception) == \
+                "Circular reference: 'a' on line 1 -> 'b' on line 2 -> 'c' on line 3 -> 'a'"
+
+    def test_self_reference(self):
+        self.assertRaises(configtamer.CircularReferenceError, configtamer.parse, "a: {a}")
+
+    def test_section_references_top_level_key(self):
+        self.try_parse("""
+shop: pet shop
+parrot:
+    where: the {shop}
+        """,
+                       {'shop': 'pet shop',
+                        'parrot':
+                        {'where': 'the pet shop'}})
+
+    def test_section_key_shadows_top_level_key(self):
+        self.try_parse("""
+colour: blue
+parrot:
+    colour: green
+    breed: Norwegian {colour}
+        """,
+                       {'colour': 'blue',
+                        'parrot':
+                        {'colour': 'green',
+                         'breed': 'Norwegian green'}})
+
+    def test_hierarchical_references(self):
+        self.try_parse("""
+summary: a {parrot.colour} parrot and a {slug.state} slug
+parrot:
+    colour: blue
+    breed: Norwegian {colour}
+slug:
+    state: {Parrot.Breed}, but alive
+        """,
+                       {'summary': 'a blue parrot and a Norwegian blue, but alive slug',
+                        'parrot':
+                        {'colour': 'blue',
+                         'breed': 'Norwegian blue'},
+                        'slug':
+                        {'state': 'Norwegian blue, but alive'}})
+
+    def test_missing_hierarchical_reference(self):
+        with self.assertRaises(configtamer.MissingKeyError) as context:
+            configtamer.parse("parrot:\n    colour: blue\nslug:\n    state: {parrot.state}")
+        assert context.exception.path == "slug.state"
+        assert context.exception.line == 4
+
+
+class TestLazyConfig(TestParser):
+    config_string = """
+pet: parrot
+state: dead
+complaint: this {pet} is {state}
+broken: {no_such_key}
+parrot:
+    colour: blue
+    breed: Norwegian {colour}
+slug:
+    broken: {nor_this_one}
+"""
+
+    def test_values_are_interpolated_when_read(self):
+        parsed = configtamer.parse(self.config_string, lazy=True)
+        assert parsed.complaint == "this parrot is dead"
+        assert parsed['Parrot']['breed'] == "Norwegian blue"
+        self.assertRaises(configtamer.MissingKeyError, getattr, parsed, 'broken')
+        self.assertRaises(configtamer.MissingKeyError, getattr, parsed.slug, 'broken')
+
+    def test_values_are_cached(self):
+        parsed = configtamer.parse(self.config_string, lazy=True)
+        assert parsed.parrot is parsed.parrot
+        assert parsed.complaint is parsed['complaint']
+
+    def test_unread_values_are_not_interpolated(self):
+        parsed = configtamer.parse(self.config_string, lazy=True)
+        assert parsed.parrot.breed == "Norwegian blue"
+        assert set(parsed._scope.resolved) == set()
+        assert set(parsed._scope.sections['parrot'].resolved) == set(['colour', 'breed'])
+        assert parsed._scope.sections['slug'].resolved == {}
+
+    def test_keys_without_reading_values(self):
+        parsed = configtamer.parse(self.config_string, lazy=True)
+        assert set(parsed) == set(['pet', 'state', 'complaint', 'broken', 'parrot', 'slug'])
+        assert len(parsed) == 6
+        assert 'parrot' in parsed
+        assert 'no_such_key' not in parsed
+        assert parsed._scope.resolved == {}
+
+    def test_missing_attribute(self):
+        parsed = configtamer.parse(self.config_string, lazy=True)
+        self.assertRaises(AttributeError, getattr, parsed, 'no_such_key')
+        self.assertRaises(KeyError, parsed.__getitem__, 'no_such_key')
+
+    def test_errors_are_not_taken_for_missing_keys(self):
+        parsed = configtamer.parse(self.config_string, lazy=True)
+        assert 'broken' in parsed and 'Broken' in parsed.slug
+        self.assertRaises(configtamer.MissingKeyError, parsed.get, 'broken')
+        self.assertRaises(configtamer.MissingKeyError, parsed.slug.get, 'BROKEN', 'default')
+        self.assertRaises(configtamer.MissingKeyError, hasattr, parsed, 'broken')
+        assert parsed.get('no_such_key', 'default') == 'default'
+        assert parsed.get('Pet') == 'parrot'
+
+
 class TestSections(TestParser):
     def test_section_with_one_assignment(self):
         self.try_parse("""
@@ -387,7 +554,7 @@ shopkeeper:
                          "state": "Alive but confused"}})
 
     def test_top_level_after_section(self):
-        self.assertRaises(SyntaxError, configtamer.parse, """
+        self.assert_syntax_error("""
 Where: pet shop
 parrot:
     is: no more
@@ -481,6 +648,1401 @@ slug:
         
 
 
+class TestSectionDefaults(TestParser):
+    config_string = """
+production:
+    code_dir: /var/src/some_project
+    wsgi_dir: {code_dir}/app.wsgi
+    dbservers: db1, db2
+
+development [default: production]:
+    code_dir: ~/code/some_project/
+"""
+
+    def test_readme_example(self):
+        self.try_parse(self.config_string,
+                       {'production': {'code_dir': '/var/src/some_project',
+                                       'wsgi_dir': '/var/src/some_project/app.wsgi',
+                                       'dbservers': 'db1, db2'},
+                        'development': {'code_dir': '~/code/some_project/',
+                                        'wsgi_dir': '~/code/some_project//app.wsgi',
+                                        'dbservers': 'db1, db2'}})
+
+    def test_header_syntax(self):
+        self.try_parse("a:\n    x: 1\nb[DEFAULT:a]:\n    y: 2\nc  [ default : B ]  :\n    z: 3\n",
+                       {'a': {'x': '1'},
+                        'b': {'x': '1', 'y': '2'},
+                        'c': {'x': '1', 'y': '2', 'z': '3'}})
+        for config_string in ["a:\n    x: 1\nb [a]:\n    y: 2\n",
+                              "a:\n    x: 1\nb [default a]:\n    y: 2\n",
+                              "a:\n    x: 1\nb [default: a:\n    y: 2\n"]:
+            self.assert_syntax_error(config_string)
+
+    def test_inherited_values_are_shared(self):
+        for lazy in (False, True):
+            parsed = configtamer.parse(self.config_string, lazy=lazy)
+            assert parsed.development.dbservers is parsed.production.dbservers
+
+    def test_scopes_are_not_kept(self):
+        parsed = configtamer.parse(self.config_string)
+        assert type(parsed.development) is configtamer.config.Config
+        assert not hasattr(parsed.development, '_scope')
+
+    def test_inherited_values_are_resolved_when_read(self):
+        parsed = configtamer.parse(self.config_string, lazy=True)
+        scope = parsed.development._scope
+        assert scope.assignments == {'code_dir': ('~/code/some_project/', 8)}
+        assert set(scope.resolved) == set()
+        assert parsed.development.wsgi_dir == '~/code/some_project//app.wsgi'
+        assert set(scope.resolved) == set(['code_dir', 'wsgi_dir'])
+
+    def test_flatten_defaults(self):
+        parsed = configtamer.parse(self.config_string, flatten_defaults=True)
+        assert type(parsed.development) is configtamer.config.Config
+        assert dict(parsed.development) == {'code_dir': '~/code/some_project/',
+                                            'wsgi_dir': '~/code/some_project//app.wsgi',
+                                            'dbservers': 'db1, db2'}
+
+    def test_chain(self):
+        lines = ["s0:", "    base: /srv", "    path: {base}/s0", "    level: 0"]
+        for i in range(1, 6):
+            lines.extend(["s{} [default: s{}]:".format(i, i - 1),
+                          "    level: {}".format(i)])
+        lines.extend(["    base: /home"])
+        for flatten_defaults in (False, True):
+            parsed = configtamer.parse("\n".join(lines), flatten_defaults=flatten_defaults)
+            assert list(parsed.s5) == ['level', 'base', 'path']
+            assert parsed.s5.path == "/home/s0"
+            assert parsed.s4.path == "/srv/s0"
+            assert parsed.s3.level == "3"
+
+    def test_default_can_be_defined_later(self):
+        self.try_parse("b [default: a]:\n    y: {x}{x}\na:\n    x: 1\n",
+                       {'b': {'x': '1', 'y': '11'},
+                        'a': {'x': '1'}})
+
+    def test_missing_default(self):
+        with self.assertRaises(configtamer.MissingKeyError) as cm:
+            configtamer.parse("a:\n    x: 1\nb [default: nope]:\n    y: 2\n")
+        assert str(cm.exception) == "Key 'nope' is not defined (referenced by 'b' on line 3)"
+
+    def test_circular_defaults(self):
+        with self.assertRaises(configtamer.CircularReferenceError) as cm:
+            configtamer.parse("a [default: b]:\n    x: 1\nb [default: a]:\n    y: 2\n")
+        assert str(cm.exception) == "Circular reference: 'a' on line 1 -> 'b' on line 3 -> 'a'"
+        self.assertRaises(configtamer.CircularReferenceError,
+                          configtamer.parse, "a [default: a]:\n    x: 1\n")
+
+    def test_missing_key_in_inherited_value(self):
+        parsed = configtamer.parse("a:\n    x: {y}\nb [default: a]:\n    y: 2\n", lazy=True)
+        assert parsed.b.x == "2"
+        self.assertRaises(configtamer.MissingKeyError, getattr, parsed.a, 'x')
+
+
+class TestContinuationLines(TestParser):
+    def test_top_level(self):
+        self.try_parse("webservers: web1,\n  web2,\n\tweb42,\nparrot: dead\n",
+                       {'webservers': 'web1, web2, web42,',
+                        'parrot': 'dead'})
+
+    def test_in_section(self):
+        self.try_parse("""
+servers:
+    webservers: web1,
+                {first},
+                web42
+    first: web2
+""", {'servers': {'webservers': 'web1, web2, web42',
+                  'first': 'web2'}})
+
+    def test_only_deeper_lines(self):
+        # Lines indented as deeply as the key are assignments, as ever
+        self.try_parse("servers:\n    parrot: dead,\n    slug: mute,\n\n      still: mute\n",
+                       {'servers': {'parrot': 'dead,',
+                                    'slug': 'mute,',
+                                    'still': 'mute'}})
+
+    def test_line_numbers(self):
+        parsed = configtamer.fastparser.parse_lines("parrot: dead,\n  deceased\nslug: mute\n")
+        assert parsed == [{'key': 'parrot', 'value': 'dead, deceased', 'line': 1},
+                          {'key': 'slug', 'value': 'mute', 'line': 3}]
+
+    def test_syntax_errors(self):
+        for config_string in ["parrot: dead,\n  deceased\x0b\n",
+                              "servers:\n    parrot: dead,\n      deceased,\n  \tslug: mute\n"]:
+            self.assert_syntax_error(config_string)
+
+
+class TestNestedSections(TestParser):
+    config_string = """
+production:
+    code_dir: /var/src/some_project
+
+    servers:
+        dbservers = db1, db2
+        webservers: web1,
+                    web2,
+        backup:
+            host: {dbservers}
+    wsgi_dir: {code_dir}/app.wsgi
+
+development [default: production]:
+    code_dir: ~/code/some_project
+    servers:
+        dbservers: {production.servers.backup.host}
+"""
+
+    def test_nested_sections(self):
+        self.try_parse(self.config_string,
+                       {'production': {'code_dir': '/var/src/some_project',
+                                       'wsgi_dir': '/var/src/some_project/app.wsgi',
+                                       'servers': {'dbservers': 'db1, db2',
+                                                   'webservers': 'web1, web2,',
+                                                   'backup': {'host': 'db1, db2'}}},
+                        'development': {'code_dir': '~/code/some_project',
+                                        'wsgi_dir': '~/code/some_project/app.wsgi',
+                                        'servers': {'dbservers': 'db1, db2'}}})
+
+    def test_subsection_defaults(self):
+        self.try_parse("app:\n  base:\n    user: nobody\n  web [default: base]:\n    port: 80\n",
+                       {'app': {'base': {'user': 'nobody'},
+                                'web': {'user': 'nobody', 'port': '80'}}})
+
+    def test_errors_in_subsections_of_sections_with_defaults(self):
+        config_string = "base:\n    a: 1\nprod [default: base]:\n    servers:\n        db: {missing}\n"
+        with self.assertRaises(configtamer.MissingKeyError) as cm:
+            configtamer.parse(config_string)
+        assert str(cm.exception) == "Key 'missing' is not defined (referenced by 'prod.servers.db' on line 5)"
+
+    def test_indented_header_without_deeper_lines(self):
+        # As ever, it starts a top-level section
+        self.try_parse("parrot:\n    state: dead\n  slug:\n  state: mute\n",
+                       {'parrot': {'state': 'dead'},
+                        'slug': {'state': 'mute'}})
+
+    def test_syntax_errors(self):
+        for config_string in ["parrot:\n  slug:\n    state: mute\n   \tfoo\n",
+                              "parrot:\n  slug:\n    state:\n"]:
+            self.assert_syntax_error(config_string)
+
+    def test_events(self):
+        import io
+        events = list(configtamer.iterparse(io.StringIO("parrot:\n  slug:\n    state: mute\n  state: dead\n")))
+        assert [event[:2] for event in events] == [
+            (configtamer.SECTION_START, 'parrot'), (configtamer.SECTION_START, 'slug'),
+            (configtamer.ASSIGNMENT, 'state'), (configtamer.SECTION_END, 'slug'),
+            (configtamer.ASSIGNMENT, 'state'), (configtamer.SECTION_END, 'parrot')]
+
+    def test_get_path(self):
+        for lazy in (False, True):
+            config = configtamer.parse(self.config_string, lazy=lazy)
+            assert config.get_path("production.servers.backup.host") == "db1, db2"
+            assert config.get_path("Development.Servers.DBServers") == "db1, db2"
+            assert config.get_path("development.servers") == {'dbservers': 'db1, db2'}
+            assert config.get_path("production.servers.nope") is None
+            assert config.get_path("production.code_dir.nope", "default") == "default"
+            assert config.production.get_path("servers.dbservers") == "db1, db2"
+
+    def test_dump(self):
+        config = configtamer.parse(self.config_string, flatten_defaults=True)
+        assert configtamer.parse(configtamer.dumps(config)) == config
+
+
+class TestReparse(unittest.TestCase):
+    config_string = """
+root: /srv
+parrot:
+    colour: blue
+    breed: Norwegian {colour}
+slug:
+    home: {root}/slug
+shop:
+    stock: {parrot.breed}, {slug.home}
+cheese_shop [default: shop]:
+    owner: Henry
+"""
+
+    def reparse(self, old_config, new_text):
+        config = configtamer.reparse(old_config, new_text)
+        assert config == configtamer.parse(new_text)
+        return config
+
+    def test_unchanged_sections_are_reused(self):
+        old = configtamer.parse(self.config_string, incremental=True)
+        new = self.reparse(old, self.config_string.replace("Henry", "Mousebender"))
+        assert new.cheese_shop.owner == "Mousebender"
+        for name in ['parrot', 'slug', 'shop']:
+            assert new[name] is old[name]
+        assert new.cheese_shop is not old.cheese_shop
+
+    def test_dependent_sections_are_rebuilt(self):
+        old = configtamer.parse(self.config_string, incremental=True)
+        new = self.reparse(old, self.config_string.replace("blue", "green"))
+        assert new.shop.stock == "Norwegian green, /srv/slug"
+        assert new.cheese_shop.stock == "Norwegian green, /srv/slug"
+        assert new.slug is old.slug
+
+        new = self.reparse(old, self.config_string.replace("/srv", "/var"))
+        assert new.cheese_shop.stock == "Norwegian blue, /var/slug"
+        assert new.parrot is old.parrot
+
+    def test_unchanged_values_of_edited_top_level(self):
+        old = configtamer.parse(self.config_string, incremental=True)
+        new = self.reparse(old, "spam: eggs\n" + self.config_string)
+        assert new.spam == "eggs"
+        for name in ['parrot', 'slug', 'shop', 'cheese_shop']:
+            assert new[name] is old[name]
+
+    def test_added_and_removed_sections(self):
+        old = configtamer.parse(self.config_string, incremental=True)
+        new = self.reparse(old, self.config_string + "ministry:\n    walk: silly\n")
+        assert new.ministry.walk == "silly"
+        assert new.shop is old.shop
+        new = self.reparse(new, self.config_string.replace("slug:\n    home: {root}/slug\n", ""
+                                                          ).replace(", {slug.home}", ""))
+        assert 'slug' not in new
+        assert new.parrot is old.parrot
+
+    def test_chained_reparse(self):
+        config = configtamer.parse(self.config_string, incremental=True)
+        parrot = config.parrot
+        for owner in ["Mousebender", "Wensleydale", "Praline"]:
+            config = self.reparse(config, self.config_string.replace("Henry", owner))
+            assert config.cheese_shop.owner == owner
+            assert config.parrot is parrot
+
+    def test_errors_are_those_of_parse(self):
+        old = configtamer.parse(self.config_string, incremental=True)
+        new_text = self.config_string.replace("{colour}", "{color}")
+        with self.assertRaises(configtamer.MissingKeyError) as cm:
+            configtamer.reparse(old, new_text)
+        assert str(cm.exception) == "Key 'color' is not defined (referenced by 'parrot.breed' on line 5)"
+        new_text = self.config_string.replace("    owner", "owner")
+        self.assertRaises(SyntaxError, configtamer.reparse, old, new_text)
+
+    def test_line_numbers(self):
+        old = configtamer.parse(self.config_string, incremental=True)
+        new_text = "\n\n" + self.config_string.replace("Henry", "{nobody}")
+        with self.assertRaises(configtamer.MissingKeyError) as cm:
+            configtamer.incremental._reparse(old, configtamer.incremental._old_digests(old), new_text)
+        assert cm.exception.line == 13
+
+    def test_only_digests_are_kept(self):
+        config = configtamer.parse(self.config_string, incremental=True)
+        _, digests = configtamer.incremental._digests[id(config)]
+        assert sorted(digests) == ['cheese_shop', 'parrot', 'shop', 'slug']
+        assert all(isinstance(digest, bytes) for digest in digests.values())
+        assert id(configtamer.parse(self.config_string)) not in configtamer.incremental._digests
+
+    def test_not_incremental(self):
+        old = configtamer.parse(self.config_string)
+        new = self.reparse(old, self.config_string.replace("Henry", "Mousebender"))
+        assert new.parrot is not old.parrot
+        newer = self.reparse(new, self.config_string)
+        assert newer.parrot is new.parrot
+
+    def test_unknown_config(self):
+        config = configtamer.config.Config({'foo': 'bar'})
+        new = self.reparse(config, self.config_string)
+        assert new.parrot.breed == "Norwegian blue"
+
+
+class TestParseSections(unittest.TestCase):
+    config_string = TestReparse.config_string + """ministry:
+    walk: silly
+"""
+
+    def parse(self, config_string, sections, **kwargs):
+        config = configtamer.parse(config_string, sections=sections, **kwargs)
+        whole = configtamer.parse(config_string, **kwargs)
+        assert config == dict((name.lower(), whole[name]) for name in sections)
+        return config
+
+    def test_sections(self):
+        for engine in ['fast', 'peg']:
+            config = self.parse(self.config_string, ['cheese_shop', 'Parrot'], engine=engine)
+            assert list(config) == ['cheese_shop', 'parrot']
+            assert config.cheese_shop.stock == "Norwegian blue, /srv/slug"
+        config = self.parse(self.config_string, ['shop'], lazy=True)
+        assert isinstance(config.shop, configtamer.config.LazyConfig)
+        self.assertRaises(KeyError, configtamer.parse, self.config_string, sections=['root'])
+        self.assertRaises(KeyError, configtamer.parse, self.config_string, sections=['spam'])
+
+    def test_other_sections_are_skipped(self):
+        config_string = self.config_string.replace("    walk: silly", "    walk silly")
+        config = configtamer.parse(config_string, sections=['shop'])
+        assert config.shop.stock == "Norwegian blue, /srv/slug"
+        self.assertRaises(SyntaxError, configtamer.parse, config_string, sections=['ministry'])
+
+    def test_errors(self):
+        config_string = self.config_string.replace("{slug.home}", "{slug.house}")
+        with self.assertRaises(configtamer.MissingKeyError) as cm:
+            configtamer.parse(config_string, sections=['cheese_shop'], flatten_defaults=True)
+        assert str(cm.exception) == ("Key 'slug.house' is not defined "
+                                     "(referenced by 'cheese_shop.stock' on line 9)")
+        config_string = self.config_string.replace("    owner", "owner")
+        with self.assertRaises(SyntaxError) as cm:
+            configtamer.parse(config_string, sections=['cheese_shop'])
+        assert "(line 10, column 1)" in str(cm.exception)
+
+    def test_indented_headers(self):
+        # "slug" holds the top-level section "snail" too
+        config_string = self.config_string.replace(
+            "shop:", "    snail:\n    home: {slug.home}/snail\nshop:")
+        config = self.parse(config_string, ['snail', 'shop'])
+        assert config.snail.home == "/srv/slug/snail"
+
+
+class TestParseStats(unittest.TestCase):
+    config_string = """
+root: /srv
+parrot:
+    colour: blue
+    breed: Norwegian {colour}
+slug:
+    home: {root}/slug
+"""
+
+    def test_phases(self):
+        for engine, phases in [('peg', ['grammar', 'visit', 'flatten', 'scopes', 'interpolate']),
+                               ('fast', ['parse', 'scopes', 'interpolate'])]:
+            stats = configtamer.ParseStats()
+            config = configtamer.parse(self.config_string, engine=engine, stats=stats)
+            assert config == configtamer.parse(self.config_string)
+            assert [phase.name for phase in stats.phases] == phases
+            assert all(phase.seconds >= 0 and phase.peak_memory is None for phase in stats.phases)
+            assert stats.seconds == sum(phase.seconds for phase in stats.phases)
+            assert (stats.lines, stats.sections, stats.assignments, stats.interpolations) == (8, 2, 4, 2)
+        assert stats.nodes == 8
+
+    def test_lazy(self):
+        stats = configtamer.ParseStats()
+        config = configtamer.parse(self.config_string, lazy=True, stats=stats)
+        assert stats.interpolations == 0
+        assert config.slug.home == "/srv/slug"
+
+    @unittest.skipIf(sys.version_info < (3, 4), "No tracemalloc")
+    def test_memory(self):
+        stats = configtamer.ParseStats(memory=True)
+        configtamer.parse(self.config_string, engine='peg', stats=stats)
+        assert stats.phases[0].peak_memory > 0
+        assert stats.peak_memory >= stats.phases[0].peak_memory
+        assert "peak KiB" in str(stats)
+
+
+class TestSpec(unittest.TestCase):
+    spec_string = """
+name: Some Project
+debug: True [optional, bool, default=False]
+production:
+    code_dir: /path/to/code [path]
+    wsgi_dir: {code_dir}/app.wsgi [path]
+    instances = 2 [optional, int, default=1]
+    load = 0.5 [optional, float]
+    dbservers = db1, db2 [list]
+"""
+    config_string = """
+name: parrot
+production:
+    code_dir: /var/src/some_project
+    wsgi_dir: {code_dir}/app.wsgi
+    dbservers = db1, db2,
+development [default: production]:
+    code_dir: ~/code/some_project/
+    load: 0.25
+"""
+
+    def test_readme_example(self):
+        spec = configtamer.compile_spec(self.spec_string)
+        config = spec.parse(self.config_string)
+        assert config.name == "parrot"
+        assert config.debug is False
+        assert config.production.wsgi_dir == "/var/src/some_project/app.wsgi"
+        assert config.development.wsgi_dir == "~/code/some_project/app.wsgi"
+        assert config.production.dbservers == ['db1', 'db2']
+        assert config.development.instances == 1
+        assert config.development.load == 0.25
+        assert 'load' not in config.production
+
+    def test_apply(self):
+        spec = configtamer.compile_spec(self.spec_string)
+        config = spec.apply(configtamer.parse(self.config_string))
+        # Without the text, there's no telling which sections have defaults
+        assert config.development.load == "0.25"
+        assert config.production.instances == 1
+
+    def test_spec_is_reusable(self):
+        spec = configtamer.compile_spec(self.spec_string)
+        for instances in range(3):
+            config = spec.parse(self.config_string.replace(
+                "dbservers", "instances: {}\n    dbservers".format(instances), 1))
+            assert config.production.instances == instances
+
+    def test_types(self):
+        spec = configtamer.compile_spec("a: 1 [int]\nb: 1 [float]\nc: yes [bool]\nd: x [list]\n"
+                                        "e: /x [path]\nf: x [str]\ng: x")
+        config = spec.parse("a: 42\nb: 2.5\nc: Off\nd: x , y,z,\ne: /a//b/c/\nf: 42\ng: 42")
+        assert config == {'a': 42, 'b': 2.5, 'c': False, 'd': ['x', 'y', 'z'],
+                          'e': os.path.normpath('/a/b/c'), 'f': '42', 'g': '42'}
+
+    def test_missing_keys_and_sections(self):
+        spec = configtamer.compile_spec(self.spec_string)
+        with self.assertRaises(configtamer.ValidationError) as cm:
+            spec.parse("production:\n    code_dir: /\n    wsgi_dir: /\n    dbservers: x\n")
+        assert str(cm.exception) == "Missing required key 'name'"
+        with self.assertRaises(configtamer.ValidationError) as cm:
+            spec.parse("name: x\n")
+        assert cm.exception.path == "production.code_dir"
+        spec = configtamer.compile_spec("parrot:\n    state: dead [optional, default=resting]\n")
+        assert spec.parse("") == {'parrot': {'state': 'resting'}}
+
+    def test_invalid_values(self):
+        spec = configtamer.compile_spec(self.spec_string)
+        with self.assertRaises(configtamer.ValidationError) as cm:
+            spec.parse(self.config_string.replace("0.25", "lots"))
+        assert cm.exception.path == "development.load"
+        self.assertRaises(configtamer.ValidationError, spec.parse, "name: x\nproduction: x\n")
+        self.assertRaises(configtamer.ValidationError, spec.parse,
+                          self.config_string.replace("name: parrot", "name: parrot\ndebug: maybe"))
+
+    def test_invalid_specs(self):
+        for spec_string in ["a: 1 [integer]",
+                            "a: 1 [int, default=x]",
+                            "a: 1 [bool, default=maybe]",
+                            "a:"]:
+            self.assertRaises(configtamer.SpecError, configtamer.compile_spec, spec_string)
+
+
+class TestInclude(unittest.TestCase):
+    logging = "log_level: info\nlogging:\n    level: {log_level}\n    file: /var/log/app.log\n"
+
+    def setUp(self):
+        import tempfile
+        self.directory = tempfile.mkdtemp()
+        self.write("logging.config", self.logging)
+        configtamer.include.clear()
+
+    def tearDown(self):
+        import shutil
+        configtamer.include.clear()
+        shutil.rmtree(self.directory)
+
+    def write(self, name, config_string):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as config_file:
+            config_file.write(config_string.encode('utf-8'))
+        return path
+
+    def parse(self, config_string, **options):
+        configs = [configtamer.parse(config_string, engine=engine, directory=self.directory, **options)
+                   for engine in configtamer.parser.engines]
+        assert configs[0] == configs[1]
+        return configs[0]
+
+    def test_include(self):
+        config = self.parse("@include logging.config\nservice: billing\n"
+                            "app:\n    log: {logging.file}\n")
+        assert config == {'log_level': 'info', 'service': 'billing',
+                          'logging': {'level': 'info', 'file': '/var/log/app.log'},
+                          'app': {'log': '/var/log/app.log'}}
+
+    def test_fragments_are_interpolated_on_their_own(self):
+        config = self.parse("log_level: debug\n@include logging.config\n")
+        assert config.logging.level == "info"
+        config = self.parse("@include logging.config\nlog_level: debug\n")
+        assert config.log_level == "debug"
+        assert config.logging.level == "info"
+
+    def test_sections_are_merged(self):
+        config = self.parse("@include logging.config\n"
+                            "logging:\n    file: /tmp/app.log\n    format: {log_level}\n")
+        assert config.logging == {'level': 'info', 'file': '/tmp/app.log', 'format': 'info'}
+
+    def test_sections_can_default_to_included_ones(self):
+        config = self.parse("@include logging.config\nquiet [default: logging]:\n    level: error\n")
+        assert config.quiet == {'level': 'error', 'file': '/var/log/app.log'}
+
+    def test_fragments_are_parsed_once(self):
+        path = os.path.join(self.directory, "logging.config")
+        first = self.parse("@include logging.config\n")
+        second = configtamer.parse("@include {}\n".format(path))
+        assert first == second
+        assert configtamer.include.fragment(path) is configtamer.include.fragment(path)
+
+        self.write("logging.config", self.logging.replace("info", "warning"))
+        assert self.parse("@include logging.config\n").log_level == "warning"
+
+    def test_nested_includes(self):
+        self.write("common.config", "@include logging.config\nhost: db1\n")
+        os.mkdir(os.path.join(self.directory, "services"))
+        self.write("services/billing.config", "@include ../common.config\nport: 5432\n")
+        config = configtamer.load(os.path.join(self.directory, "services", "billing.config"))
+        assert config.host == "db1" and config.logging.level == "info"
+
+        # Changes to nested fragments are picked up too
+        self.write("logging.config", self.logging.replace("info", "warning"))
+        config = configtamer.load(os.path.join(self.directory, "services", "billing.config"))
+        assert config.logging.level == "warning"
+
+    def test_circular_include(self):
+        self.write("a.config", "@include b.config\n")
+        self.write("b.config", "@include a.config\n")
+        with self.assertRaises(configtamer.IncludeError) as context:
+            self.parse("@include a.config\n")
+        assert "Circular include" in str(context.exception)
+
+    def test_missing_fragment(self):
+        with self.assertRaises(configtamer.IncludeError) as context:
+            self.parse("\n@include missing.config\n")
+        assert "(line 2)" in str(context.exception)
+
+    def test_events(self):
+        import io
+        events = list(configtamer.iterparse(io.StringIO("@include logging.config  \nkey: value\n")))
+        assert events[0] == (configtamer.INCLUDE, None, "logging.config", 1)
+
+    def test_only_at_top_level(self):
+        for config_string in ("section:\n    @include logging.config\n",
+                              "section:\n    key: value\n@include logging.config\n"):
+            self.assertRaises(SyntaxError, self.parse, config_string)
+
+
+class TestParseBuffer(unittest.TestCase):
+    config_string = ("root: /srv\n"
+                     "parrot:\n    colour: blue  \n    breed: Norwegian {colour}\n"
+                     "cafe [default: parrot]:\n    menu: spam, œufs, {root}\r\n")
+
+    def test_same_as_parse(self):
+        expected = configtamer.parse(self.config_string)
+        for lazy in (False, True):
+            config = configtamer.parse_buffer(self.config_string.encode('utf-8'), lazy=lazy)
+            assert config == expected
+
+    def test_values_are_decoded_when_read(self):
+        config = configtamer.parse_buffer(self.config_string.encode('utf-8'), lazy=True)
+        assert config.cafe.menu == "spam, œufs, /srv"
+        scope = config.parrot._scope
+        assert isinstance(scope.assignments['colour'][0], configtamer.buffers.Span)
+        assert not scope.resolved
+
+    def test_syntax_error(self):
+        # Messages only differ in how much text they quote
+        for config_string in ("key: value\n  indented: value\n", "é: x\n", "k: é\n  x\n"):
+            with self.assertRaises(SyntaxError) as context:
+                configtamer.parse_buffer(config_string.encode('utf-8'))
+            with self.assertRaises(SyntaxError) as expected:
+                configtamer.parse(config_string)
+            assert str(context.exception).split("(line")[1] == str(expected.exception).split("(line")[1]
+
+    def test_load_mmap(self):
+        import tempfile
+        import shutil
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "example.config")
+            for config_string in (self.config_string, ""):
+                with open(path, 'wb') as config_file:
+                    config_file.write(config_string.encode('utf-8'))
+                config = configtamer.load(path, mmap=True, lazy=True)
+                assert config == configtamer.parse(config_string)
+                del config
+            expected = configtamer.parse(self.config_string)
+            with open(path, 'wb') as config_file:
+                config_file.write(self.config_string.encode('utf-8'))
+            # Options parse_buffer() doesn't take
+            stats = configtamer.ParseStats()
+            assert configtamer.load(path, mmap=True, engine='peg') == expected
+            assert configtamer.load(path, mmap=True, stats=stats) == expected
+            assert stats.phases
+            assert configtamer.load(path, mmap=True, sections=['parrot']) == {'parrot': expected.parrot}
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestCheck(unittest.TestCase):
+    def problems(self, config_string):
+        return [(problem.line, problem.column, type(problem.error))
+                for problem in configtamer.check(config_string)]
+
+    def test_valid(self):
+        assert configtamer.check("key: value\nsection:\n    other: {key}\n") == []
+
+    def test_every_syntax_error(self):
+        config_string = ("key: value\n"
+                         "oops\n"
+                         "section:\n"
+                         "    good: yes\n"
+                         "    bad line\n"
+                         "    also: good\x0b\n"
+                         "broken section\n"
+                         "    skipped: yes\n"
+                         "last:\n"
+                         "    key: {section.good}\n")
+        assert self.problems(config_string) == [(2, 1, SyntaxError), (5, 5, SyntaxError),
+                                                (6, 15, SyntaxError), (7, 1, SyntaxError)]
+
+    def test_first_error_is_parses(self):
+        # check() only quotes the rest of the line: make it long enough not to matter
+        config_string = "key: value\nsection:\n    good: yes\ntop_level_key: too late\n"
+        with self.assertRaises(SyntaxError) as context:
+            configtamer.parse(config_string)
+        problems = configtamer.check(config_string)
+        assert str(problems[0].error) == str(context.exception)
+
+    def test_empty_section(self):
+        assert self.problems("empty:\nfull:\n    key: value\n") == [(1, 1, SyntaxError)]
+
+    def test_invalid_first_line_of_section(self):
+        # parse() blames the header, check() the line itself
+        problems = configtamer.check("section:\n  bad\n    key: value\n")
+        assert [(problem.line, problem.column) for problem in problems] == [(2, 3)]
+
+    def test_interpolation_errors(self):
+        config_string = ("a: {missing}\n"
+                         "b: {a}\n"
+                         "c: {d}\n"
+                         "d: {c}\n"
+                         "one [default: nowhere]:\n    key: value\n"
+                         "two [default: three]:\n    key: value\n"
+                         "three [default: two]:\n    key: {other}\n")
+        problems = configtamer.check(config_string)
+        assert [(problem.line, type(problem.error)) for problem in problems] == [
+            (1, configtamer.MissingKeyError),
+            (3, configtamer.CircularReferenceError),
+            (5, configtamer.MissingKeyError),
+            (7, configtamer.CircularReferenceError),
+            (10, configtamer.MissingKeyError),
+        ]
+
+    def test_includes(self):
+        problems = configtamer.check("@include /nonexistent/fragment.config\nkey: value\n")
+        assert [(problem.line, type(problem.error)) for problem in problems] == [(1, configtamer.IncludeError)]
+
+
+class TestFastParser(TestParser):
+    def test_unknown_engine(self):
+        self.assertRaises(ValueError, configtamer.parse, "foo: bar", engine="nudge-nudge")
+
+    def test_syntax_errors_match_reference_engine(self):
+        for config_string in ["parrot:",
+                              "parrot:\n\n",
+                              "\n   ",
+                              "   ",
+                              "parrot: dead\x0b\nslug: mute",
+                              "parrot:\n    state: dead\x0b",
+                              "parrot:\n\tstate: dead",
+                              "parrot:\n    state: dead\n  not a key\n",
+                              "parrot: dead\r\n  slug:\r\n\tstate: mute"]:
+            self.assert_syntax_error(config_string)
+
+    def test_indented_section_header_after_assignment(self):
+        # The grammar lets empty lines swallow the indentation of a
+        # section header that follows other lines. Both engines agree.
+        self.try_parse("parrot: dead\n  slug:\n    state: mute\n",
+                       {'parrot': 'dead',
+                        'slug': {'state': 'mute'}})
+
+    def test_mixed_line_endings(self):
+        self.try_parse("parrot: dead\r\nslug:\r    state: mute\n",
+                       {'parrot': 'dead',
+                        'slug': {'state': 'mute'}})
+
+    def test_large_config(self):
+        # Far deeper than the recursion limit, if the parser recursed per line.
+        lines = ["key{}: value {}".format(i, i) for i in range(20000)]
+        lines.append("section:")
+        lines.extend("    key{}: value {}".format(i, i) for i in range(20000))
+        parsed = configtamer.parse("\n".join(lines), engine="fast")
+        assert len(parsed) == 20001
+        assert parsed.key19999 == "value 19999"
+        assert len(parsed.section) == 20000
+        assert parsed.section.key0 == "value 0"
+
+
+class TestIterparse(unittest.TestCase):
+    config_string = """
+where: pet shop
+
+parrot:
+    colour: blue
+    breed: Norwegian {colour}
+
+slug:
+    state: alive
+"""
+    expected_events = [(configtamer.ASSIGNMENT, 'where', 'pet shop', 2),
+                       (configtamer.SECTION_START, 'parrot', None, 4),
+                       (configtamer.ASSIGNMENT, 'colour', 'blue', 5),
+                       (configtamer.ASSIGNMENT, 'breed', 'Norwegian {colour}', 6),
+                       (configtamer.SECTION_END, 'parrot', None, 6),
+                       (configtamer.SECTION_START, 'slug', None, 8),
+                       (configtamer.ASSIGNMENT, 'state', 'alive', 9),
+                       (configtamer.SECTION_END, 'slug', None, 9)]
+
+    def test_text_file(self):
+        import io
+        events = list(configtamer.iterparse(io.StringIO(self.config_string)))
+        assert events == self.expected_events, events
+        assert events[1].event == configtamer.SECTION_START
+        assert events[2].key == 'colour'
+        assert events[2].value == 'blue'
+        assert events[2].line == 5
+
+    def test_binary_file(self):
+        import io
+        for newline in ("\n", "\r\n", "\r"):
+            config_bytes = self.config_string.replace("\n", newline).encode('utf-8')
+            events = list(configtamer.iterparse(io.BytesIO(config_bytes)))
+            assert events == self.expected_events, events
+
+    def test_events_are_yielded_as_lines_are_read(self):
+        import io
+        config_file = io.StringIO(self.config_string)
+        events = configtamer.iterparse(config_file)
+        assert next(events) == self.expected_events[0]
+        assert config_file.tell() < len(self.config_string)
+
+    def test_syntax_error(self):
+        import io
+        events = configtamer.iterparse(io.StringIO("parrot: dead\n  slug: mute\n"))
+        assert next(events) == (configtamer.ASSIGNMENT, 'parrot', 'dead', 1)
+        with self.assertRaises(SyntaxError) as context:
+            next(events)
+        assert "'slug: mute' (line 2, column 3)" in str(context.exception)
+
+    def test_empty_file(self):
+        import io
+        assert list(configtamer.iterparse(io.StringIO(""))) == []
+
+
+class TestConfig(unittest.TestCase):
+    def test_values_in_instance_dict(self):
+        config = configtamer.parse("Parrot: dead\nslug:\n    state: mute\n")
+        assert config.__dict__ == {'parrot': 'dead', 'slug': {'state': 'mute'}}
+        assert type(config.slug) is type(config) is configtamer.config.Config
+        lazy_config = configtamer.parse("parrot: dead\nslug: {parrot}\n", lazy=True)
+        assert lazy_config.__dict__ == {}
+        assert lazy_config.slug == 'dead'
+        assert lazy_config.__dict__ == {'slug': 'dead'}
+
+    def test_lazy_configs_with_the_same_keys_share_a_shape(self):
+        config = configtamer.parse("""
+parrot:
+    colour: blue
+    state: dead
+other_parrot:
+    Colour: green
+    State: pining
+""", lazy=True)
+        assert config.parrot._shape is config.other_parrot._shape
+        assert config.parrot._shape is not config._shape
+
+    def test_keys_do_not_hide_methods(self):
+        for lazy in (False, True):
+            config = configtamer.parse("keys: 1\nitems: 2\nvalues: 3\nget: 4\nget_path: 5\n", lazy=lazy)
+            assert config['items'] == '2'
+            assert config.get('get') == '4'
+            assert config.get_path('get_path') == '5'
+            assert list(config.keys()) == ['keys', 'items', 'values', 'get', 'get_path']
+            assert list(config.values()) == ['1', '2', '3', '4', '5']
+            assert dict(config.items()) == dict(config) == {
+                'keys': '1', 'items': '2', 'values': '3', 'get': '4', 'get_path': '5'}
+            self.assertRaises(AttributeError, setattr, config, 'get', 'lost')
+
+    def test_mapping_and_items(self):
+        config = configtamer.config.Config([('Parrot', 'dead'), ('slug', 'mute'), ('PARROT', 'deceased')])
+        assert list(config) == ['parrot', 'slug']
+        assert config['Parrot'] == config.PARROT == 'deceased'
+        assert config == {'parrot': 'deceased', 'slug': 'mute'}
+        assert configtamer.config.Config({'Parrot': 'dead'}) == {'parrot': 'dead'}
+        self.assertRaises(KeyError, config.__getitem__, 'shopkeeper')
+        self.assertRaises(AttributeError, getattr, config, 'shopkeeper')
+
+    def test_keys_that_are_not_identifiers(self):
+        config = configtamer.config.Config([('9lives', 'cat'), ('a b', 'c')])
+        assert config['9Lives'] == getattr(config, '9lives') == 'cat'
+        assert config['a b'] == 'c'
+
+    def test_read_only(self):
+        for config in (configtamer.parse("parrot: alive"), configtamer.parse("parrot: alive", lazy=True)):
+            self.assertRaises(AttributeError, setattr, config, 'parrot', 'dead')
+            self.assertRaises(AttributeError, setattr, config, 'slug', 'mute')
+            self.assertRaises(AttributeError, delattr, config, 'parrot')
+            assert config == {'parrot': 'alive'}
+
+    def test_pickle(self):
+        import pickle
+        for lazy in (False, True):
+            config = configtamer.parse("parrot: dead\nslug:\n    state: {parrot}", lazy=lazy)
+            unpickled = pickle.loads(pickle.dumps(config))
+            assert unpickled == {'parrot': 'dead', 'slug': {'state': 'dead'}}
+            assert type(unpickled) is type(configtamer.parse("parrot: x\nslug:\n    state: y"))
+
+
+class TestValue(unittest.TestCase):
+    config_string = """
+servers: web1,
+         web2,
+         web42,
+instances: 2
+debug: Yes
+ratio: 0.5
+"""
+
+    def test_conversions(self):
+        config = configtamer.parse(self.config_string)
+        assert config.servers == "web1, web2, web42,"
+        assert config.servers.as_list() == ['web1', 'web2', 'web42']
+        assert config.instances.as_int() == 2
+        assert config.debug.as_bool() is True
+        assert config.ratio.as_float() == 0.5
+        self.assertRaises(ValueError, config.debug.as_int)
+
+    def test_conversions_are_remembered(self):
+        config = configtamer.parse(self.config_string)
+        servers = config.servers.as_list()
+        servers.append('web43')
+        assert config.servers.as_list() == ['web1', 'web2', 'web42']
+        assert config.servers.__dict__['list'] == ('web1', 'web2', 'web42')
+
+    def test_values_everywhere(self):
+        for config in (configtamer.parse(self.config_string, lazy=True),
+                       configtamer.parse_buffer(self.config_string.encode('utf-8')),
+                       configtamer.cache.deserialize(configtamer.cache.serialize(
+                           configtamer.parse(self.config_string)))):
+            assert config.instances.as_int() == 2
+
+
+class TestLoad(unittest.TestCase):
+    config_string = "parrot: dead\nslug:\n    state: {parrot}\n"
+
+    def setUp(self):
+        import tempfile
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "example.config")
+        self.write(self.config_string)
+        self.cache = configtamer.ParseCache(os.path.join(self.directory, "cache"))
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.directory)
+
+    def write(self, config_string, age=60):
+        with open(self.path, 'wb') as config_file:
+            config_file.write(config_string.encode('utf-8'))
+        # Make sure the mtime changes, and that it isn't too recent to trust
+        mtime = time.time() - age
+        os.utime(self.path, (mtime, mtime))
+
+    def test_load(self):
+        assert configtamer.load(self.path) == {'parrot': 'dead', 'slug': {'state': 'dead'}}
+
+    def test_cached_load(self):
+        expected = {'parrot': 'dead', 'slug': {'state': 'dead'}}
+        assert configtamer.load(self.path, cache=self.cache) == expected
+        assert len(os.listdir(os.path.join(self.cache.directory, 'objects'))) == 1
+
+        # Cache hits don't parse anything
+        parse = configtamer.loader.parse
+        configtamer.loader.parse = None
+        try:
+            config = configtamer.load(self.path, cache=self.cache)
+        finally:
+            configtamer.loader.parse = parse
+        assert config == expected
+        assert config.slug.state == 'dead'
+        assert isinstance(config.slug, configtamer.config.Config)
+
+    def test_partial_loads_are_not_cached(self):
+        assert configtamer.load(self.path, cache=self.cache, sections=['slug']) == {'slug': {'state': 'dead'}}
+        assert not os.path.exists(os.path.join(self.cache.directory, 'objects'))
+        assert configtamer.load(self.path, cache=self.cache) == {'parrot': 'dead', 'slug': {'state': 'dead'}}
+        assert configtamer.load(self.path, cache=self.cache, sections=['slug']) == {'slug': {'state': 'dead'}}
+
+    def test_changed_file_is_reparsed(self):
+        configtamer.load(self.path, cache=self.cache)
+        self.write(self.config_string.replace("dead", "pining"), age=30)
+        assert configtamer.load(self.path, cache=self.cache).slug.state == 'pining'
+
+    def test_changed_file_with_same_size_and_mtime(self):
+        # Recently modified files are always hashed
+        self.write(self.config_string, age=0)
+        configtamer.load(self.path, cache=self.cache)
+        self.write(self.config_string.replace("dead", "gone"), age=0)
+        assert configtamer.load(self.path, cache=self.cache).slug.state == 'gone'
+
+    def test_corrupt_entry_is_ignored(self):
+        configtamer.load(self.path, cache=self.cache)
+        objects = os.path.join(self.cache.directory, 'objects')
+        for name in os.listdir(objects):
+            with open(os.path.join(objects, name), 'wb') as entry:
+                entry.write(b"And now for something completely different")
+        assert configtamer.load(self.path, cache=self.cache).parrot == 'dead'
+
+    def test_cache_size_is_bounded(self):
+        cache = configtamer.ParseCache(self.cache.directory, max_size=1)
+        configtamer.load(self.path, cache=cache)
+        assert os.listdir(os.path.join(cache.directory, 'objects')) == []
+        # The cache is only an optimization
+        assert configtamer.load(self.path, cache=cache).parrot == 'dead'
+
+    def test_least_recently_used_entries_are_removed_first(self):
+        for digest, value in (('a', 'first'), ('b', 'second')):
+            self.cache.put(digest, configtamer.config.Config([('parrot', value)]))
+        size = os.path.getsize(os.path.join(self.cache.directory, 'objects', 'a'))
+        os.utime(os.path.join(self.cache.directory, 'objects', 'b'), (0, 0))
+        self.cache.max_size = size
+        self.cache.trim()
+        assert os.listdir(os.path.join(self.cache.directory, 'objects')) == ['a']
+
+    def test_cache_directory_from_environment(self):
+        os.environ['CONFIGTAMER_CACHE_DIR'] = self.cache.directory
+        try:
+            assert configtamer.ParseCache().directory == self.cache.directory
+            configtamer.load(self.path, cache=True)
+        finally:
+            del os.environ['CONFIGTAMER_CACHE_DIR']
+        assert len(os.listdir(os.path.join(self.cache.directory, 'objects'))) == 1
+
+
+class TestParseMany(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "example.config")
+        with open(self.path, 'w') as config_file:
+            config_file.write("parrot: dead\nslug:\n    state: {parrot}\n")
+        from pathlib import Path
+        self.sources = ["parrot: resting\n",
+                        Path(self.path),
+                        "parrot: {state}\n",
+                        "parrot:\n",
+                        Path(self.directory, "no_such_file")]
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.directory)
+
+    def check(self, results):
+        assert [result.config for result in results] == [
+            {'parrot': 'resting'}, {'parrot': 'dead', 'slug': {'state': 'dead'}}, None, None, None]
+        errors = [type(result.error) for result in results]
+        assert errors[:2] == [type(None), type(None)]
+        assert errors[2] is configtamer.MissingKeyError
+        assert errors[3] is SyntaxError
+        assert issubclass(errors[4], EnvironmentError)
+        assert str(results[2].error) == "Key 'state' is not defined (referenced by 'parrot' on line 1)"
+
+    def test_in_process(self):
+        self.check(configtamer.parse_many(self.sources, workers=1))
+
+    def test_process_pool(self):
+        self.check(configtamer.parse_many(self.sources * 3, workers=2, chunksize=2)[:5])
+
+    def test_lazy(self):
+        self.check(configtamer.parse_many(self.sources, workers=1, lazy=True))
+        self.check(configtamer.parse_many(self.sources * 3, workers=2, chunksize=2, lazy=True)[:5])
+
+    def test_empty(self):
+        assert configtamer.parse_many([]) == []
+
+    def test_strings_are_texts(self):
+        results = configtamer.parse_many(["parrot: dead", "", self.path], workers=1)
+        assert [result.config for result in results[:2]] == [{'parrot': 'dead'}, {}]
+        assert isinstance(results[2].error, SyntaxError)
+        results = configtamer.parse_many([self.path], workers=1, paths=True)
+        assert results[0].config == {'parrot': 'dead', 'slug': {'state': 'dead'}}
+
+
+class TestParallelEngine(unittest.TestCase):
+    config_string = "".join("section_{0}:\n    key: {0}\n    other: {{key}} {{root}}\n".format(i)
+                            for i in range(20))
+
+    def test_same_as_fast(self):
+        from configtamer.batch import parse_parallel
+        config_string = "root: /srv\n\n" + self.config_string
+        parsed = parse_parallel(config_string, workers=2)
+        assert parsed == configtamer.parser.parse_lines(config_string)
+        assert parsed[-1]['line'] == 60
+        config = configtamer.parse(config_string, engine='parallel')
+        assert config == configtamer.parse(config_string)
+
+    def test_syntax_errors(self):
+        from configtamer.batch import parse_parallel
+        for old, new in [("    key: 19", "key: 19"), ("    key: 1\n", "    key 1\n"),
+                         ("section_7:", "section_7")]:
+            config_string = self.config_string.replace(old, new)
+            with self.assertRaises(SyntaxError) as cm:
+                parse_parallel(config_string, workers=2)
+            with self.assertRaises(SyntaxError) as expected:
+                configtamer.parse(config_string)
+            assert str(cm.exception) == str(expected.exception)
+
+    def test_pickle(self):
+        import pickle
+        configs = [configtamer.parse("a: {b}\nb: 1\nsection:\n    c: {a}\n", lazy=lazy)
+                   for lazy in (False, True, False)]
+        data = pickle.dumps(configs, 2)
+        unpickled = pickle.loads(data)
+        assert unpickled == configs
+        assert type(unpickled[0]) is type(unpickled[2]) is type(configs[0])
+        assert type(unpickled[1].section) is type(configs[0].section)
+        # The keys of Configs of the same shape are only written once
+        assert pickle.dumps(configs[::2], 2).count(b'section') == 1
+
+    def test_pickle_errors(self):
+        import pickle
+        for error in [configtamer.MissingKeyError('a', 'b', 2),
+                      configtamer.CircularReferenceError([('a', 1), ('b', None)]),
+                      configtamer.ValidationError("Bad", 'a.b')]:
+            unpickled = pickle.loads(pickle.dumps(error, 2))
+            assert type(unpickled) is type(error)
+            assert str(unpickled) == str(error)
+            assert unpickled.__dict__ == error.__dict__
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "No async/await")
+class TestAsyncLoad(unittest.TestCase):
+    def setUp(self):
+        import asyncio
+        import tempfile
+        self.directory = tempfile.mkdtemp()
+        self.paths = []
+        for i in range(3):
+            path = os.path.join(self.directory, "{}.config".format(i))
+            with open(path, 'w') as config_file:
+                config_file.write("number: {}\n".format(i))
+            self.paths.append(path)
+        self.loop = asyncio.new_event_loop()
+        self.loads = []
+        self.load = configtamer.aio.load
+        configtamer.aio.load = self.counting_load
+
+    def tearDown(self):
+        import shutil
+        configtamer.aio.load = self.load
+        self.loop.close()
+        shutil.rmtree(self.directory)
+
+    def counting_load(self, path, **load_options):
+        self.loads.append(path)
+        return self.load(path, **load_options)
+
+    def wait(self, awaitable):
+        return self.loop.run_until_complete(awaitable)
+
+    def test_aload(self):
+        assert self.wait(configtamer.aload(self.paths[1])) == {'number': '1'}
+
+    def test_aload_many(self):
+        configs = self.wait(configtamer.aload_many(self.paths * 2, limit=2))
+        assert [config.number for config in configs] == ['0', '1', '2'] * 2
+
+        import asyncio
+        paths = self.paths + [os.path.join(self.directory, "no_such_file")]
+        results = self.wait(configtamer.aload_many(paths, return_exceptions=True))
+        assert isinstance(results[3], EnvironmentError)
+        self.assertRaises(EnvironmentError, self.wait, configtamer.aload_many(paths))
+
+    def test_concurrent_loads_are_coalesced(self):
+        import asyncio
+        tasks = [self.loop.create_task(configtamer.aload(self.paths[0])) for _ in range(5)]
+        configs = self.wait(asyncio.gather(*tasks))
+        assert all(config is configs[0] for config in configs)
+        assert self.loads == [self.paths[0]]
+        # Once it's done, it's loaded again
+        self.wait(configtamer.aload(self.paths[0]))
+        assert len(self.loads) == 2
+        assert configtamer.aio._in_flight[self.loop] == {}
+
+    def test_cancellation(self):
+        import asyncio
+        import threading
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_load(path, **load_options):
+            started.set()
+            release.wait(10)
+            return self.load(path)
+        configtamer.aio.load = slow_load
+
+        first = self.loop.create_task(configtamer.aload(self.paths[0]))
+        second = self.loop.create_task(configtamer.aload(self.paths[0]))
+        self.wait(self.loop.run_in_executor(None, started.wait, 10))
+        first.cancel()
+        self.assertRaises(asyncio.CancelledError, self.wait, first)
+        # The other caller still gets its config
+        release.set()
+        assert self.wait(second) == {'number': '0'}
+
+
+class TestWatch(unittest.TestCase):
+    config_string = "parrot: dead\nslug:\n    state: {parrot}\n    colour: grey\n"
+
+    def setUp(self):
+        import tempfile
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "example.config")
+        self.write(self.config_string)
+        self.calls = []
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.directory)
+
+    def write(self, config_string, age=60):
+        with open(self.path, 'wb') as config_file:
+            config_file.write(config_string.encode('utf-8'))
+        mtime = time.time() - age
+        os.utime(self.path, (mtime, mtime))
+
+    def callback(self, config, changes):
+        self.calls.append((config, changes))
+
+    def watcher(self, **options):
+        return configtamer.Watcher(self.path, self.callback, debounce=0, **options)
+
+    def test_changes(self):
+        watcher = self.watcher()
+        assert watcher.check() == []
+        self.write(self.config_string.replace("dead", "pining").replace("colour: grey", "food: leaves"))
+        changes = watcher.check()
+        assert changes == [(configtamer.CHANGED, 'parrot'),
+                           (configtamer.CHANGED, 'slug.state'),
+                           (configtamer.ADDED, 'slug.food'),
+                           (configtamer.REMOVED, 'slug.colour')]
+        assert self.calls == [(watcher.config, changes)]
+        assert watcher.config.slug.state == "pining"
+        assert watcher.check() == []
+
+    def test_unchanged_contents(self):
+        watcher = self.watcher()
+        self.write(self.config_string, age=30)
+        assert watcher.check() == []
+        self.write(self.config_string.replace("\n", "\n\n"), age=20)
+        assert watcher.check() == []
+        assert self.calls == []
+
+    def test_errors_keep_last_config(self):
+        watcher = self.watcher()
+        config = watcher.config
+        self.write("parrot: {slug}")
+        self.assertRaises(configtamer.MissingKeyError, watcher.check)
+        assert watcher.config is config
+        # Reported once
+        assert watcher.check() == []
+        self.write(self.config_string.replace("grey", "brown"), age=30)
+        assert watcher.check() == [(configtamer.CHANGED, 'slug.colour')]
+
+    def test_removed_file(self):
+        watcher = self.watcher()
+        os.remove(self.path)
+        assert watcher.check() == []
+        self.write("shop: closed\n" + self.config_string)
+        assert watcher.check() == [(configtamer.ADDED, 'shop')]
+
+    def test_background_thread(self):
+        import threading
+        called = threading.Event()
+        errors = []
+        watcher = configtamer.watch(self.path, lambda config, changes: called.set(),
+                                    interval=0.01, debounce=0.01, on_error=errors.append)
+        try:
+            self.write(self.config_string.replace("dead", "resting"), age=0)
+            assert called.wait(10)
+        finally:
+            watcher.stop()
+        assert watcher.config.parrot == "resting"
+        assert errors == []
+
+
+class TestWriter(unittest.TestCase):
+    def test_round_trip(self):
+        config_string = """
+root: /srv
+spam: eggs, {root}
+
+defaults:
+    user: nobody
+    path: {root}/default
+
+app [default: defaults]:
+    path: {root}/app
+    greeting: "hello, {user}!"
+"""
+        config = configtamer.parse(config_string)
+        output = configtamer.dumps(config)
+        assert configtamer.parse(output) == config
+        assert output.startswith("root: /srv\nspam: eggs, /srv\n\ndefaults:\n    user: nobody\n")
+
+    def test_writer(self):
+        import io
+        output = io.StringIO()
+        with configtamer.Writer(output) as writer:
+            writer.assign('root', '/srv')
+            writer.section('defaults')
+            writer.assign('user', 'nobody')
+            writer.section('app', default='defaults')
+            writer.assign('path', '{root}/{user}')
+        assert output.getvalue() == "root: /srv\n\ndefaults:\n    user: nobody\n\napp [default: defaults]:\n    path: {root}/{user}\n"
+        assert configtamer.parse(output.getvalue()).app.path == "/srv/nobody"
+
+    def test_streams(self):
+        import io
+        output = io.StringIO()
+        writer = configtamer.Writer(output)
+        for i in range(configtamer.writer.BUFFER_LINES):
+            writer.assign('key_{}'.format(i), 'value')
+        assert output.getvalue().count("\n") == configtamer.writer.BUFFER_LINES
+        writer.assign('last', 'value')
+        assert output.getvalue().count("\n") == configtamer.writer.BUFFER_LINES
+        writer.close()
+        assert output.getvalue().endswith("last: value\n")
+
+    def test_invalid(self):
+        import io
+        writer = configtamer.Writer(io.StringIO())
+        for key, value in (('two words', 'value'), ('key', ''), ('key', ' padded'), ('key', 'two\nlines')):
+            with self.assertRaises(ValueError):
+                writer.assign(key, value)
+        with self.assertRaises(TypeError):
+            writer.assign('key', 42)
+        with self.assertRaises(ValueError):
+            writer.section('too_deep', depth=2)
+        writer.section('empty')
+        with self.assertRaises(ValueError):
+            writer.section('next')
+        with self.assertRaises(ValueError):
+            writer.close()
+
+    def test_dump_reinterpolated(self):
+        config = configtamer.config.Config([('root', '/srv'), ('literal', '{root}')])
+        with self.assertRaises(ValueError):
+            configtamer.dumps(config)
+
+
+class TestLayered(unittest.TestCase):
+    def setUp(self):
+        self.base = configtamer.parse("name: app\ndb:\n    host: localhost\n    port: 5432\n"
+                                      "log:\n    level: info\n")
+
+    def test_merge(self):
+        layers = configtamer.layered([
+            ('base', self.base),
+            ('production', configtamer.parse("db:\n    host: db.prod\n")),
+            ('environ', configtamer.environ_source('MYAPP_', {'MYAPP_DB__PORT': '6432', 'PATH': '/bin'})),
+            ('command line', configtamer.overrides_source(['log.level = debug'])),
+        ])
+        assert layers.config == {'name': 'app', 'db': {'host': 'db.prod', 'port': '6432'},
+                                 'log': {'level': 'debug'}}
+        assert layers.config.db.port.as_int() == 6432
+        assert layers.provenance('db.host') == 'production'
+        assert layers.provenance('name') == 'base'
+        assert layers.layers_of('db.port') == ['base', 'environ']
+        self.assertRaises(KeyError, layers.provenance, 'db')
+        self.assertRaises(ValueError, configtamer.overrides_source, ['log.level'])
+
+    def test_update(self):
+        layers = configtamer.layered([self.base, {'db.host': 'db.prod'}])
+        before = layers.config
+        after = layers.update(1, {'log': {'level': 'debug'}, 'cache.size': '10'})
+        assert after is layers.config
+        assert after == {'name': 'app', 'db': {'host': 'localhost', 'port': '5432'},
+                         'log': {'level': 'debug'}, 'cache': {'size': '10'}}
+        assert before.db.host == 'db.prod'
+        assert after.db is not before.db and after.log is not before.log
+        # Untouched sections are shared
+        assert layers.update(1, {'cache.size': '20'}).db is after.db
+        assert layers.provenance('log.level') == 0
+        assert layers.update(1, {}) == self.base
+
+    def test_conflict(self):
+        layers = configtamer.layered([('base', self.base), ('override', {'db.host': 'db.prod'})])
+        self.assertRaises(ValueError, layers.update, 'override', {'db': 'db.prod'})
+        self.assertRaises(ValueError, layers.update, 'override', {'name.first': 'app'})
+        self.assertRaises(ValueError, configtamer.layered, [{'a': '1', 'a.b': '2'}])
+        assert layers.config.db.host == 'db.prod'
+        assert layers.provenance('db.host') == 'override'
+        self.assertRaises(KeyError, layers.update, 'environ', {})
+
+
+class TestConfigHandle(unittest.TestCase):
+    def test_publish(self):
+        handle = configtamer.ConfigHandle()
+        assert handle.version == 0 and handle.config is None
+        first = configtamer.parse("parrot: dead")
+        assert handle.publish(first) == (1, first)
+        assert handle.config is first
+        second = configtamer.parse("parrot: pining")
+        handle.publish(second)
+        assert handle.snapshot() == (2, second)
+
+    def test_pin(self):
+        handle = configtamer.ConfigHandle(configtamer.parse("parrot: dead"))
+        with handle.pin() as snapshot:
+            assert snapshot.version == 1
+            handle.publish(configtamer.parse("parrot: pining"))
+            assert handle.config.parrot == "dead"
+            with handle.pin() as inner:
+                assert inner is snapshot
+                assert handle.version == 1 and handle.config.parrot == "dead"
+            assert handle.version == 1
+        assert handle.config.parrot == "pining"
+
+    def test_pins_are_per_thread(self):
+        import threading
+        handle = configtamer.ConfigHandle(configtamer.parse("parrot: dead"))
+        seen = []
+        with handle.pin():
+            handle.publish(configtamer.parse("parrot: pining"))
+            thread = threading.Thread(target=lambda: seen.append(handle.config.parrot))
+            thread.start()
+            thread.join()
+            assert handle.config.parrot == "dead"
+        assert seen == ["pining"]
+
+    def test_watch(self):
+        import tempfile
+        import shutil
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "example.config")
+            with open(path, 'w') as config_file:
+                config_file.write("parrot: dead\n")
+            handle = configtamer.ConfigHandle()
+            watcher = handle.watch(path, interval=60, debounce=0)
+            try:
+                assert handle.snapshot().version == 1 and handle.config.parrot == "dead"
+                with open(path, 'w') as config_file:
+                    config_file.write("parrot: pining\n")
+                mtime = time.time() - 60
+                os.utime(path, (mtime, mtime))
+                watcher.check()
+                assert handle.version == 2 and handle.config.parrot == "pining"
+            finally:
+                watcher.stop()
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestImport(unittest.TestCase):
+    def test_heavy_modules_are_imported_on_demand(self):
+        import subprocess
+        # marshal (like some of the others, on some Pythons) may well have
+        # been imported before configtamer was
+        code = ("import sys\n"
+                "before = set(sys.modules)\n"
+                "import configtamer\n"
+                "print(sorted(set(['parsimonious', 'asyncio', 'multiprocessing', 'logging', 'hashlib',\n"
+                "                  'marshal', 'mmap', 'threading']) & (set(sys.modules) - before)))\n"
+                "configtamer.parse('key: value', engine='peg')\n"
+                "print('parsimonious' in sys.modules)\n")
+        output = subprocess.check_output([sys.executable, '-c', code], universal_newlines=True,
+                                         cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+        assert output.split("\n")[:2] == ["[]", "True"]
+
+
 class TestFlatten(unittest.TestCase):
     def test_None(self):
         assert configtamer.parser.flatten(None) == [None]